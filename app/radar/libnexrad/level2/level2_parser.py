@@ -99,6 +99,9 @@ class NEXRADLevel2File:
         File like object from which data is read.
     _msg_type : '31' or '1':
         Type of radial messages in file.
+    _gate_filters : dict
+        Gate filters already built by get_gate_filter, keyed by scan, moment
+        and thresholds.
 
     References
     ----------
@@ -180,6 +183,7 @@ class NEXRADLevel2File:
             )
 
             self.vcp = None
+        self._gate_filters = {}
         return
 
     def close(self):
@@ -569,6 +573,108 @@ class NEXRADLevel2File:
         # moment is not present in any scan, mask all values
         return np.ma.masked_less_equal(data, 1)
 
+    def get_gate_filter(
+        self,
+        scan,
+        moment="VEL",
+        max_ngates=None,
+        min_refl=-20.0,
+        max_refl=100.0,
+        min_rhv=None,
+        max_sw=None,
+    ):
+        """
+        Retrieve the gates of a scan which should be excluded from processing.
+
+        The filter is built directly from the raw moment codes, in the same
+        spirit as Py-ART's moment_based_gate_filter.  Gates of the filtered
+        moment which are below threshold, range folded or missing (raw codes
+        0 and 1) are excluded, along with gates outside the reflectivity,
+        correlation coefficient and spectrum width thresholds.  Threshold
+        moments are sampled at the gate nearest in range to each gate of the
+        filtered moment, gates where a threshold moment is below threshold,
+        range folded or missing are excluded as well.  Threshold moments not
+        recorded in the scan are ignored.  Filters are cached per scan.
+
+        Parameters
+        ----------
+        scan : int
+            Scan (0 based) to build the filter for.
+        moment : 'REF', 'VEL', 'SW', 'ZDR', 'PHI', 'RHO', or 'CFP'
+            Moment whose gates the filter applies to.
+        max_ngates : int or None
+            Number of gates in each ray of the filter, None uses the number
+            of gates of the moment in the scan.
+        min_refl, max_refl : float or None
+            Gates with reflectivities (dBZ) outside of these limits are
+            excluded, None disables the limit.
+        min_rhv : float or None
+            Gates with a correlation coefficient below this value are
+            excluded, None disables the limit.
+        max_sw : float or None
+            Gates with a spectrum width (m/s) above this value are excluded,
+            None disables the limit.
+
+        Returns
+        -------
+        gate_filter : ndarray
+            Read-only boolean array of shape (nrays, max_ngates), True for
+            the gates which should be excluded.
+
+        """
+        if max_ngates is None:
+            max_ngates = self.get_ngates(scan, moment)
+        key = (scan, moment, max_ngates, min_refl, max_refl, min_rhv, max_sw)
+        if key in self._gate_filters:
+            return self._gate_filters[key]
+
+        raw = self.get_data(moment, max_ngates, scans=[scan], raw_data=True)
+        excluded = raw <= 1
+        gate_range = self.get_range(scan, moment)[:max_ngates]
+        limits = (
+            ("REF", min_refl, max_refl, True),
+            ("RHO", min_rhv, None, min_rhv is not None),
+            ("SW", None, max_sw, max_sw is not None),
+        )
+        for thresh_moment, lower, upper, apply in limits:
+            if not apply:
+                continue
+            values = self._moment_on_gates(scan, thresh_moment, gate_range)
+            if values is None:
+                continue
+            excluded[:, : len(gate_range)] |= values.mask
+            with np.errstate(invalid="ignore"):
+                if lower is not None:
+                    excluded[:, : len(gate_range)] |= values.data < lower
+                if upper is not None:
+                    excluded[:, : len(gate_range)] |= values.data > upper
+
+        excluded.flags.writeable = False
+        self._gate_filters[key] = excluded
+        return excluded
+
+    def _moment_on_gates(self, scan, moment, gate_range):
+        """
+        Sample a moment of a scan at the gates nearest to the given ranges.
+
+        Returns a masked array or None when the moment was not recorded.
+        """
+        msg = self.radial_records[self.scan_msgs[scan][0]]
+        if moment not in msg or msg[moment]["ngates"] == 0:
+            return None
+        dic = msg[moment]
+        ngates = dic["ngates"]
+        raw = self.get_data(moment, ngates, scans=[scan], raw_data=True)
+
+        gate = np.rint((gate_range - dic["first_gate"]) / dic["gate_spacing"])
+        outside = (gate < 0) | (gate >= ngates)
+        gate = np.clip(gate, 0, ngates - 1).astype(np.intp)
+        raw = raw[:, gate]
+        raw[:, outside] = 1
+
+        values = (raw - np.float32(dic["offset"])) / np.float32(dic["scale"])
+        return np.ma.array(values, mask=raw <= 1)
+
 
 def _bits_to_code(msg, moment):
     """
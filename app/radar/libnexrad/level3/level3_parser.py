@@ -7,26 +7,81 @@ import bz2
 from collections import defaultdict, namedtuple, OrderedDict
 import contextlib
 import datetime
+import functools
+import gzip
+import io
 import logging
 import pathlib
 import re
 import struct
-from xdrlib import Unpacker
 from struct import Struct
 import zlib
 
 import numpy as np
 
-from metpy.io._tools import open_as_needed
-
 log = logging.getLogger(__name__)
 
+# Size of the slices of input handed to a zlib decompressor at once
+_zlib_chunk_size = 65536
+
+# Largest piece of output requested from a decompressor at once
+_decompress_chunk_size = 1 << 20
+
+# Largest compression ratio trusted when preallocating from a decompressed size hint
+_max_compression_ratio = 32
+
+# Number of data mapper lookup tables kept for reuse across products
+LUT_CACHE_SIZE = 32
+
+_int_formats = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+_int_structs = {(size, endian, signed): Struct(('>' if endian == 'big' else '<')
+                                               + (fmt if signed else fmt.upper()))
+                for size, fmt in _int_formats.items()
+                for endian in ('big', 'little') for signed in (True, False)}
+
+
+def _open_as_needed(filename, mode='rb'):
+    """Return a file object for filename, transparently decompressing gzip and bz2 data.
+
+    File-like objects are passed through, wrapped in a decompressor if their leading
+    bytes carry a gzip or bz2 signature.
+    """
+    if hasattr(filename, 'read'):
+        lead = filename.read(4)
+        if hasattr(filename, 'seek'):
+            filename.seek(0)
+        else:
+            filename = io.BytesIO(lead + filename.read())
+    else:
+        filename = str(filename)
+        with open(filename, 'rb') as probe:
+            lead = probe.read(4)
+        if lead.startswith(b'\x1f\x8b'):
+            return gzip.open(filename, mode)
+        if lead.startswith(b'BZh'):
+            return bz2.open(filename, mode)
+        return open(filename, mode)
+
+    if lead.startswith(b'\x1f\x8b'):
+        return gzip.GzipFile(fileobj=filename)
+    if lead.startswith(b'BZh'):
+        return bz2.BZ2File(filename)
+    return filename
+
+
 class IOBuffer:
-    """Holds bytes from a buffer to simplify parsing and random access."""
+    """Holds bytes from a buffer to simplify parsing and random access.
+
+    Reads do not copy: they return :class:`memoryview` slices of the data or
+    decode values directly at the current offset.
+    """
 
     def __init__(self, source):
         """Initialize the IOBuffer with the source data."""
-        self._data = bytearray(source)
+        if not isinstance(source, (bytes, bytearray, memoryview)):
+            source = bytes(source)
+        self._data = source
+        self._view = memoryview(source)
         self.reset()
 
     @classmethod
@@ -59,12 +114,63 @@ class IOBuffer:
     def splice(self, mark, newdata):
         """Replace the data after the marked location with the specified data."""
         self.jump_to(mark)
-        self._data = self._data[:self._offset] + bytearray(newdata)
+        self._data = b''.join((self._view[:self._offset], newdata))
+        self._view = memoryview(self._data)
+
+    def splice_decompressed(self, mark, decompressor, size_hint=0):
+        """Replace the data after the marked location with their decompressed contents.
+
+        The data are inflated in chunks by instances of `decompressor` (for instance
+        `bz2.BZ2Decompressor`, concatenated streams are all decompressed) straight into a
+        buffer preallocated from `size_hint`, the expected size of the decompressed data.
+        The hint usually comes from the product itself, so it is only used once the first
+        chunk has decompressed, and capped at `_max_compression_ratio` times the
+        compressed size. The compressed data are never copied and the buffer is only
+        resized if the hint is wrong. Raises the same errors as `bz2.decompress` for
+        invalid or truncated data, leaving the buffer untouched.
+        """
+        self.jump_to(mark)
+        start = self._offset
+        data = self._view[start:]
+        size_hint = min(max(size_hint, 0), _max_compression_ratio * len(data))
+        out = None
+        pos = start
+        num_streams = 0
+        while data:
+            decomp = decompressor()
+            while not decomp.eof:
+                try:
+                    chunk = decomp.decompress(data, _decompress_chunk_size)
+                except OSError:
+                    # Like bz2.decompress, ignore trailing data that are not a valid stream
+                    if not num_streams:
+                        raise
+                    data = b''
+                    break
+                data = b''
+                if out is None:
+                    out = bytearray(start + max(size_hint, len(chunk)))
+                    out[:start] = self._view[:start]
+                if pos + len(chunk) > len(out):
+                    out.extend(bytes(pos + len(chunk) - len(out)))
+                out[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+                if decomp.needs_input and not decomp.eof:
+                    raise ValueError('Compressed data ended before the end-of-stream marker '
+                                     'was reached')
+            else:
+                num_streams += 1
+                data = decomp.unused_data
+        if out is None:
+            out = bytearray(self._view[:start])
+        del out[pos:]
+        self._data = out
+        self._view = memoryview(out)
 
     def read_struct(self, struct_class):
         """Parse and return a structure from the current buffer offset."""
-        struct = struct_class.unpack_from(memoryview(self._data), self._offset)
-        self.skip(struct_class.size)
+        struct = struct_class.unpack_from(self._view, self._offset)
+        self._offset += struct_class.size
         return struct
 
     def read_func(self, func, num_bytes=None):
@@ -76,7 +182,7 @@ class IOBuffer:
 
     def read_ascii(self, num_bytes=None):
         """Return the specified bytes as ascii-formatted text."""
-        return self.read(num_bytes).decode('ascii')
+        return str(self.read(num_bytes), 'ascii')
 
     def read_binary(self, num, item_type='B'):
         """Parse the current buffer offset as the specified code."""
@@ -93,57 +199,62 @@ class IOBuffer:
 
     def read_int(self, size, endian, signed):
         """Parse the current buffer offset as the specified integer code."""
-        return int.from_bytes(self.read(size), endian, signed=signed)
+        int_struct = _int_structs.get((size, endian, signed))
+        if int_struct is None:
+            return int.from_bytes(self.read(size), endian, signed=signed)
+        value, = int_struct.unpack_from(self._view, self._offset)
+        self._offset += size
+        return value
 
     def read_array(self, count, dtype):
         """Read an array of values from the buffer."""
-        ret = np.frombuffer(self._data, offset=self._offset, dtype=dtype, count=count)
+        ret = np.frombuffer(self._view, offset=self._offset, dtype=dtype, count=count)
         self.skip(ret.nbytes)
         return ret
 
     def read(self, num_bytes=None):
         """Read and return the specified bytes from the buffer."""
         res = self.get_next(num_bytes)
-        self.skip(len(res))
+        self._offset += len(res)
         return res
 
     def get_next(self, num_bytes=None):
-        """Get the next bytes in the buffer without modifying the offset."""
+        """Get a view of the next bytes in the buffer without modifying the offset."""
         if num_bytes is None:
-            return self._data[self._offset:]
+            return self._view[self._offset:]
         else:
-            return self._data[self._offset:self._offset + num_bytes]
+            return self._view[self._offset:self._offset + num_bytes]
 
     def skip(self, num_bytes):
         """Jump the ahead the specified bytes in the buffer."""
         if num_bytes is None:
-            self._offset = len(self._data)
+            self._offset = len(self._view)
         else:
             self._offset += num_bytes
 
     def check_remains(self, num_bytes):
         """Check that the number of bytes specified remains in the buffer."""
-        return len(self._data[self._offset:]) == num_bytes
+        return max(len(self._view) - self._offset, 0) == num_bytes
 
     def truncate(self, num_bytes):
         """Remove the specified number of bytes from the end of the buffer."""
-        self._data = self._data[:-num_bytes]
+        self._view = self._view[:-num_bytes]
 
     def at_end(self):
         """Return whether the buffer has reached the end of data."""
-        return self._offset >= len(self._data)
+        return self._offset >= len(self._view)
 
     def __getitem__(self, item):
         """Return the data at the specified location."""
-        return self._data[item]
+        return self._view[item]
 
     def __str__(self):
         """Return a string representation of the IOBuffer."""
-        return f'Size: {len(self._data)} Offset: {self._offset}'
+        return f'Size: {len(self._view)} Offset: {self._offset}'
 
     def __len__(self):
         """Return the amount of data in the buffer."""
-        return len(self._data)
+        return len(self._view)
 
 class BitField:
     """Convert an integer to a string for each bit."""
@@ -204,8 +315,39 @@ class DictStruct(Struct):
         """Unpack the next bytes from a file object."""
         return self._create(super().unpack_from(buff, offset))
 
+# namedtuple classes by name and fields, so their instances can be pickled and unpickled
+# in another process even though the classes are not module attributes
+_namedtuple_types = {}
+
+
+def _namedtuple(name, fields):
+    """Return the namedtuple class with name and fields, creating it the first time."""
+    fields = tuple(fields.split() if isinstance(fields, str) else fields)
+    key = (name, fields)
+    if key not in _namedtuple_types:
+        def __reduce__(self):
+            return _make_namedtuple, (name, fields, tuple(self))
+
+        _namedtuple_types[key] = type(name, (namedtuple(name, fields),),
+                                      {'__slots__': (), '__reduce__': __reduce__})
+    return _namedtuple_types[key]
+
+
+def _make_namedtuple(name, fields, values):
+    """Rebuild a pickled namedtuple."""
+    return _namedtuple(name, fields)._make(values)
+
+
 class NamedStruct(Struct):
-    """Parse bytes using :class:`Struct` but provide named fields."""
+    """Parse bytes using :class:`Struct` but provide named fields.
+
+    Single structures are returned as namedtuples. Arrays of repeated structures can be
+    decoded in bulk with `unpack_array` as numpy structured records, using `dtype`.
+    """
+
+    _dtype_codes = {'b': 'i1', 'B': 'u1', '?': 'b1', 'h': 'i2', 'H': 'u2', 'i': 'i4',
+                    'I': 'u4', 'l': 'i4', 'L': 'u4', 'q': 'i8', 'Q': 'u8', 'e': 'f2',
+                    'f': 'f4', 'd': 'f8'}
 
     def __init__(self, info, prefmt='', tuple_name=None):
         """Initialize the NamedStruct."""
@@ -219,17 +361,58 @@ class NamedStruct(Struct):
                 self.converters[ind - conv_off] = i[-1]
             elif not i[0]:  # Skip items with no name
                 conv_off += 1
-        self._tuple = namedtuple(tuple_name, ' '.join(n for n in names if n))
+        self._tuple = _namedtuple(tuple_name, [n for n in names if n])
         super().__init__(prefmt + ''.join(f for f in fmts if f))
 
+        # Everything needed by _create, worked out once
+        self._info = info
+        self._prefmt = prefmt
+        self._make = self._tuple._make
+        self._conv_items = tuple(self.converters.items())
+        num_values = len(super().unpack_from(bytes(self.size)))
+        self._pad = [None] * (len(self._tuple._fields) - num_values)
+
     def _create(self, items):
-        if self.converters:
+        if self._conv_items:
             items = list(items)
-            for ind, conv in self.converters.items():
+            for ind, conv in self._conv_items:
                 items[ind] = conv(items[ind])
-            if len(items) < len(self._tuple._fields):
-                items.extend([None] * (len(self._tuple._fields) - len(items)))
-        return self.make_tuple(*items)
+        if self._pad:
+            items = list(items) + self._pad
+        return self._make(items)
+
+    @functools.cached_property
+    def dtype(self):
+        """Numpy structured dtype with the layout of the structure (without converters)."""
+        order = {'>': '>', '!': '>', '<': '<'}.get(self._prefmt[:1], '=')
+        names, formats, offsets = [], [], []
+        offset = 0
+        for name, fmt, *_ in self._info:
+            for count, code in re.findall(r'(\d*)([xcbB?hHiIlLqQefds])', fmt or ''):
+                count = int(count) if count else 1
+                if code == 'x':
+                    offset += count
+                    continue
+                if code in 'sc':
+                    dtype = np.dtype(f'S{count}')
+                else:
+                    dtype = np.dtype(order + self._dtype_codes[code])
+                    if count > 1:
+                        dtype = np.dtype((dtype, (count,)))
+                if name:
+                    names.append(name)
+                    formats.append(dtype)
+                    offsets.append(offset)
+                offset += dtype.itemsize
+        return np.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                         'itemsize': self.size})
+
+    def unpack_array(self, buff, count=-1, offset=0):
+        """Read an array of repeated structures from a buffer as numpy structured records.
+
+        Converters are not applied, fields hold the raw values.
+        """
+        return np.frombuffer(buff, dtype=self.dtype, count=count, offset=offset)
 
     def make_tuple(self, *args, **kwargs):
         """Construct the underlying tuple from values."""
@@ -252,32 +435,51 @@ class NamedStruct(Struct):
         t = self.make_tuple(**kwargs)
         return super().pack(*t)
 
-def zlib_decompress_all_frames(data):
+def zlib_decompress_all_frames(data, return_frame_count=False):
     """Decompress all frames of zlib-compressed bytes.
-    Repeatedly tries to decompress `data` until all data are decompressed, or decompression
-    fails. This will skip over bytes that are not compressed with zlib.
+    Decompresses the zlib frames that follow each other in `data` until all data are
+    decompressed, or decompression fails. Bytes that are not compressed with zlib are
+    passed through. Frames are located by walking offsets over a view of `data`, which is
+    fed to the decompressor in bounded chunks, so the time taken is linear in the size of
+    the data whatever the number of frames.
     Parameters
     ----------
-    data : bytearray or bytes
+    data : bytes-like
         Binary data compressed using zlib.
+    return_frame_count : bool, optional
+        Also return the number of zlib frames that were found.
     Returns
     -------
-        bytearray
-            All decompressed bytes
+        bytes or bytes-like
+            All decompressed bytes, `data` itself if it does not start with a zlib frame
+        int
+            The number of frames, if `return_frame_count` is True
     """
-    frames = bytearray()
-    data = bytes(data)
-    while data:
+    view = memoryview(data).cast('B')
+    pieces = []
+    num_frames = 0
+    offset = 0
+    while offset < len(view):
         decomp = zlib.decompressobj()
+        frame_start = offset
+        frame = []
         try:
-            frames += decomp.decompress(data)
-            data = decomp.unused_data
-            log.debug('Decompressed zlib frame (total %d bytes). %d bytes remain.',
-                        len(frames), len(data))
+            while not decomp.eof and offset < len(view):
+                with view[offset:offset + _zlib_chunk_size] as chunk:
+                    frame.append(decomp.decompress(chunk))
+                    offset += len(chunk) - len(decomp.unused_data)
         except zlib.error:
-            log.debug('Remaining %d bytes are not zlib compressed.', len(data))
-            frames.extend(data)
+            log.debug('Remaining %d bytes are not zlib compressed.', len(view) - frame_start)
+            pieces.append(view[frame_start:])
             break
+        pieces.extend(frame)
+        num_frames += 1
+        log.debug('Decompressed zlib frame %d (%d bytes). %d bytes remain.', num_frames,
+                  sum(len(piece) for piece in frame), len(view) - offset)
+
+    frames = b''.join(pieces) if num_frames else data
+    if return_frame_count:
+        return frames, num_frames
     return frames
 
 def version(val):
@@ -291,11 +493,20 @@ def scaler(scale):
         return val * scale
     return inner
 
+_nexrad_epoch = datetime.datetime(1970, 1, 1)
+
+
 def nexrad_to_datetime(julian_date, ms_midnight):
-    from scipy.constants import day, milli
     """Convert NEXRAD date time format to python `datetime.datetime`."""
     # Subtracting one from julian_date is because epoch date is 1
-    return datetime.datetime.utcfromtimestamp((julian_date - 1) * day + ms_midnight * milli)
+    return _nexrad_epoch + datetime.timedelta(days=julian_date - 1, milliseconds=ms_midnight)
+
+
+def nexrad_to_datetime64(julian_date, ms_midnight):
+    """Convert arrays of NEXRAD dates and times to `numpy.datetime64` in milliseconds."""
+    ms = ((np.asarray(julian_date, dtype=np.int64) - 1) * 86400000
+          + np.asarray(ms_midnight, dtype=np.int64))
+    return ms.astype('datetime64[ms]')
 
 def reduce_lists(d):
     """Replace single item lists in a dictionary with the single item."""
@@ -304,6 +515,52 @@ def reduce_lists(d):
         if len(old_data) == 1:
             d[field] = old_data[0]
 
+def stack_vectors(packets):
+    """Gather the geometry of vector and contour packets into flat arrays.
+
+    Parameters
+    ----------
+    packets : iterable of dict
+        Decoded packets, for instance a symbology layer or a graphic page. Only linked
+        vector (6, 9), vector (7, 10) and linked contour (0x0E03) packets are gathered;
+        a contour colour packet (0x0802) sets the colour of the contours that follow.
+        Polylines and unlinked vectors cannot be mixed.
+
+    Returns
+    -------
+    vectors : `numpy.ndarray`
+        float32 ``(n, 2)`` points of polylines, or ``(n, 4)`` segments if the packets
+        are unlinked vectors, in km.
+    colors : `numpy.ndarray`
+        int16 colour value of each packet, -1 where it has none.
+    offsets : `numpy.ndarray`
+        Index of the first row of each packet in vectors, followed by n, so that packet
+        i is ``vectors[offsets[i]:offsets[i + 1]]``.
+
+    """
+    parts = []
+    colors = []
+    color = None
+    for packet in packets:
+        if not isinstance(packet, dict):
+            continue
+        if 'vectors' not in packet:
+            if packet.keys() == {'color'}:
+                color = packet['color']
+            continue
+        parts.append(packet['vectors'])
+        value = packet.get('color', color)
+        colors.append(-1 if value is None else value)
+
+    lengths = [len(part) for part in parts]
+    offsets = np.zeros(len(parts) + 1, dtype=np.intp)
+    np.cumsum(lengths, out=offsets[1:])
+    ncols = parts[0].shape[1] if parts else 2
+    vectors = (np.concatenate(parts) if parts
+               else np.empty((0, ncols), dtype=np.float32))
+    return vectors, np.array(colors, dtype=np.int16), offsets
+
+
 def two_comp16(val):
     """Return the two's-complement signed representation of a 16-bit unsigned integer."""
     if val >> 15:
@@ -402,16 +659,36 @@ def supplemental_scan(ind):
 # into physical values. Can also have a 'labels' attribute to give
 # categorical labels
 class DataMapper:
-    """Convert packed integer data into physical units."""
+    """Convert packed integer data into physical units.
+
+    The lookup tables only depend on the mapper class and the product thresholds, so they
+    are built once per threshold set and shared, read-only, by every instance.
+    """
 
     # Need to find way to handle range folded
     # RANGE_FOLD = -9999
     RANGE_FOLD = float('nan')
     MISSING = float('nan')
 
-    def __init__(self, num=256):
-        print(num)
-        self.lut = np.full(num, self.MISSING, dtype=float)
+    def __init__(self, prod):
+        """Initialize the mapper with the lookup table for the product thresholds."""
+        self.lut = self._cached_lut(tuple(prod.thresholds))
+
+    @classmethod
+    @functools.lru_cache(maxsize=LUT_CACHE_SIZE)
+    def _cached_lut(cls, thresholds):
+        tables = cls._make_lut(thresholds)
+        for table in tables if isinstance(tables, tuple) else (tables,):
+            table.flags.writeable = False
+        return tables
+
+    @classmethod
+    def _make_lut(cls, thresholds):
+        return cls._empty_lut()
+
+    @classmethod
+    def _empty_lut(cls, num=256):
+        return np.full(num, cls.MISSING, dtype=float)
 
     def __call__(self, data):
         """Convert the values."""
@@ -427,19 +704,19 @@ class DigitalMapper(DataMapper):
     _max_data = 255
     range_fold = False
 
-    def __init__(self, prod):
-        """Initialize the mapper and the lookup table."""
-        super().__init__()
-        min_val = two_comp16(prod.thresholds[0]) * self._min_scale
-        inc = prod.thresholds[1] * self._inc_scale
-        num_levels = prod.thresholds[2]
+    @classmethod
+    def _make_lut(cls, thresholds):
+        lut = cls._empty_lut()
+        min_val = two_comp16(thresholds[0]) * cls._min_scale
+        inc = thresholds[1] * cls._inc_scale
+        num_levels = thresholds[2]
 
         # Generate lookup table -- sanity check on num_levels handles
         # the fact that DHR advertises 256 levels, which *includes*
         # missing, differing from other products
-        num_levels = min(num_levels, self._max_data - self._min_data + 1)
-        for i in range(num_levels):
-            self.lut[i + self._min_data] = min_val + i * inc
+        num_levels = max(min(num_levels, cls._max_data - cls._min_data + 1), 0)
+        lut[cls._min_data:cls._min_data + num_levels] = min_val + np.arange(num_levels) * inc
+        return lut
 
 
 class DigitalRefMapper(DigitalMapper):
@@ -482,20 +759,21 @@ class DigitalStormPrecipMapper(DigitalMapper):
 class DigitalVILMapper(DataMapper):
     """Mapper for digital VIL products."""
 
-    def __init__(self, prod):
-        """Initialize the VIL mapper."""
-        super().__init__()
-        lin_scale = float16(prod.thresholds[0])
-        lin_offset = float16(prod.thresholds[1])
-        log_start = prod.thresholds[2]
-        log_scale = float16(prod.thresholds[3])
-        log_offset = float16(prod.thresholds[4])
+    @classmethod
+    def _make_lut(cls, thresholds):
+        lut = cls._empty_lut()
+        lin_scale = float16(thresholds[0])
+        lin_offset = float16(thresholds[1])
+        log_start = thresholds[2]
+        log_scale = float16(thresholds[3])
+        log_offset = float16(thresholds[4])
 
         # VIL is allowed to use 2 through 254 inclusive. 0 is thresholded,
         # 1 is flagged, and 255 is reserved
         ind = np.arange(255)
-        self.lut[2:log_start] = (ind[2:log_start] - lin_offset) / lin_scale
-        self.lut[log_start:-1] = np.exp((ind[log_start:] - log_offset) / log_scale)
+        lut[2:log_start] = (ind[2:log_start] - lin_offset) / lin_scale
+        lut[log_start:-1] = np.exp((ind[log_start:] - log_offset) / log_scale)
+        return lut
 
 
 class DigitalEETMapper(DataMapper):
@@ -503,17 +781,20 @@ class DigitalEETMapper(DataMapper):
 
     def __init__(self, prod):
         """Initialize the mapper."""
-        super().__init__()
-        data_mask = prod.thresholds[0]
-        scale = prod.thresholds[1]
-        offset = prod.thresholds[2]
-        topped_mask = prod.thresholds[3]
-        self.topped_lut = [False] * 256
-        for i in range(2, 256):
-            self.lut[i] = ((i & data_mask) - offset) / scale
-            self.topped_lut[i] = bool(i & topped_mask)
-
-        self.topped_lut = np.array(self.topped_lut)
+        self.lut, self.topped_lut = self._cached_lut(tuple(prod.thresholds))
+
+    @classmethod
+    def _make_lut(cls, thresholds):
+        lut = cls._empty_lut()
+        data_mask = thresholds[0]
+        scale = thresholds[1]
+        offset = thresholds[2]
+        topped_mask = thresholds[3]
+        ind = np.arange(2, 256)
+        lut[2:] = ((ind & data_mask) - offset) / scale
+        topped_lut = np.zeros(256, dtype=bool)
+        topped_lut[2:] = (ind & topped_mask) != 0
+        return lut, topped_lut
 
     def __call__(self, data_vals):
         """Convert the data values."""
@@ -526,26 +807,27 @@ class GenericDigitalMapper(DataMapper):
     Also handles special data flags.
     """
 
-    def __init__(self, prod):
-        """Initialize the mapper by pulling out all the information from the product."""
+    @classmethod
+    def _make_lut(cls, thresholds):
         # Need to treat this value as unsigned, so we can use the full 16-bit range. This
         # is necessary at least for the DPR product, otherwise it has a value of -1.
-        max_data_val = prod.thresholds[5] & 0xFFFF
+        max_data_val = thresholds[5] & 0xFFFF
 
         # Values will be [0, max] inclusive, so need to add 1 to max value to get proper size.
-        super().__init__(max_data_val + 1)
+        lut = cls._empty_lut(max_data_val + 1)
 
-        scale = float32(prod.thresholds[0], prod.thresholds[1])
-        offset = float32(prod.thresholds[2], prod.thresholds[3])
-        leading_flags = prod.thresholds[6]
-        trailing_flags = prod.thresholds[7]
+        scale = float32(thresholds[0], thresholds[1])
+        offset = float32(thresholds[2], thresholds[3])
+        leading_flags = thresholds[6]
+        trailing_flags = thresholds[7]
 
         if leading_flags > 1:
-            self.lut[1] = self.RANGE_FOLD
+            lut[1] = cls.RANGE_FOLD
 
         # Need to add 1 to the end of the range so that it's inclusive
-        for i in range(leading_flags, max_data_val - trailing_flags + 1):
-            self.lut[i] = (i - offset) / scale
+        ind = np.arange(leading_flags, max_data_val - trailing_flags + 1)
+        lut[ind] = (ind - offset) / scale
+        return lut
 
 
 class DigitalHMCMapper(DataMapper):
@@ -557,27 +839,28 @@ class DigitalHMCMapper(DataMapper):
     labels = ['ND', 'BI', 'GC', 'IC', 'DS', 'WS', 'RA', 'HR',
               'BD', 'GR', 'HA', 'LH', 'GH', 'UK', 'RF']
 
-    def __init__(self, prod):
-        """Initialize the mapper."""
-        super().__init__()
-        for i in range(10, 256):
-            self.lut[i] = i // 10
-        self.lut[150] = self.RANGE_FOLD
+    @classmethod
+    def _make_lut(cls, thresholds):
+        lut = cls._empty_lut()
+        lut[10:] = np.arange(10, 256) // 10
+        lut[150] = cls.RANGE_FOLD
+        return lut
 
 
 # 156, 157
 class EDRMapper(DataMapper):
     """Mapper for eddy dissipation rate products."""
 
-    def __init__(self, prod):
-        """Initialize the mapper based on the product."""
-        data_levels = prod.thresholds[2]
-        super().__init__(data_levels)
-        scale = prod.thresholds[0] / 1000.
-        offset = prod.thresholds[1] / 1000.
-        leading_flags = prod.thresholds[3]
-        for i in range(leading_flags, data_levels):
-            self.lut[i] = scale * i + offset
+    @classmethod
+    def _make_lut(cls, thresholds):
+        data_levels = thresholds[2]
+        lut = cls._empty_lut(data_levels)
+        scale = thresholds[0] / 1000.
+        offset = thresholds[1] / 1000.
+        leading_flags = thresholds[3]
+        ind = np.arange(leading_flags, data_levels)
+        lut[ind] = scale * ind + offset
+        return lut
 
 
 class LegacyMapper(DataMapper):
@@ -673,7 +956,10 @@ class NEXRADLevel3File:
 
     """
 
-    def __init__(self, filename):
+    _lazy_blocks = ('sym_block', 'graph_pages', 'tab_pages', 'rcm_ref', 'rcm_vad',
+                    'rcm_remarks')
+
+    def __init__(self, filename, lazy=False):
         r"""Create instance of `Level3File`.
 
         Parameters
@@ -681,9 +967,15 @@ class NEXRADLevel3File:
         filename : str or file-like object
             If str, the name of the file to be opened. If file-like object,
             this will be read from directly.
+        lazy : bool, optional
+            If True, only the headers and the product description are decoded when the
+            file is opened. Decompressing and unpacking the symbology, graphic and tabular
+            blocks is deferred until one of `sym_block`, `graph_pages` or `tab_pages` is
+            first accessed.
 
         """
-        fobj = open_as_needed(filename)
+        self._blocks_pending = False
+        fobj = _open_as_needed(filename)
         if isinstance(filename, str):
             self.filename = filename
         elif isinstance(filename, pathlib.Path):
@@ -792,13 +1084,57 @@ class NEXRADLevel3File:
         # Store as class that can be called
         self.map_data = mapper(self)
 
+        if 'defaultVals' in self.metadata:
+            log.warning('%s: Using default metadata for product %d',
+                        self.filename, self.header.code)
+
+        self._msg_start = msg_start
+        self._blocks_start = self._buffer.set_mark()
+        if lazy:
+            self._blocks_pending = True
+        else:
+            self._unpack_blocks()
+
+    def __getattr__(self, name):
+        """Decode the product blocks on first access when opened lazily."""
+        if name in self._lazy_blocks and self.__dict__.get('_blocks_pending'):
+            self._unpack_lazy_blocks()
+            return getattr(self, name)
+        raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+
+    def __getstate__(self):
+        """Decode any pending blocks and drop the raw product buffer when pickling."""
+        if self.__dict__.get('_blocks_pending'):
+            self._unpack_lazy_blocks()
+        state = self.__dict__.copy()
+        state.pop('_buffer', None)
+        return state
+
+    def _unpack_lazy_blocks(self):
+        """Decode the blocks of a lazily opened product.
+
+        The error of a failed decode is kept and raised again on every later access.
+        """
+        error = self.__dict__.get('_blocks_error')
+        if error is None:
+            try:
+                self._unpack_blocks()
+            except Exception as e:
+                self._blocks_error = error = e
+            else:
+                self._blocks_pending = False
+                return
+        raise error
+
+    def _unpack_blocks(self):
+        msg_start = self._msg_start
+
         # Process compression if indicated. We need to fail
         # gracefully here since we default to it being on
         if self.metadata.get('compression', False):
             try:
-                comp_start = self._buffer.set_mark()
-                decomp_data = self._buffer.read_func(bz2.decompress)
-                self._buffer.splice(comp_start, decomp_data)
+                self._buffer.splice_decompressed(self._blocks_start, bz2.BZ2Decompressor,
+                                                 self.metadata.get('uncompressed_size', 0))
                 assert self._buffer.check_remains(self.metadata['uncompressed_size'])
             except OSError:
                 # Compression didn't work, so we just assume it wasn't actually compressed.
@@ -829,13 +1165,9 @@ class NEXRADLevel3File:
             if self.prod_desc.tab_off:
                 self._unpack_tabblock(msg_start, 2 * self.prod_desc.tab_off)
 
-        if 'defaultVals' in self.metadata:
-            log.warning('%s: Using default metadata for product %d',
-                        self.filename, self.header.code)
-
     def _process_wmo_header(self):
         # Read off the WMO header if necessary
-        data = self._buffer.get_next(64).decode('ascii', 'ignore')
+        data = str(self._buffer.get_next(64), 'ascii', 'ignore')
         match = wmo_finder.search(data)
         log.debug('WMO Header: %s', match)
         if match:
@@ -846,18 +1178,36 @@ class NEXRADLevel3File:
             self.wmo_code = ''
 
     def _process_end_bytes(self):
-        check_bytes = self._buffer[-4:-1]
+        check_bytes = bytes(self._buffer[-4:-1])
         log.debug('End Bytes: %s', check_bytes)
         if check_bytes in (b'\r\r\n', b'\xff\xff\n'):
             self._buffer.truncate(4)
 
     @staticmethod
     def _unpack_rle_data(data):
-        # Unpack Run-length encoded data
-        unpacked = []
-        for run in data:
-            num, val = run >> 4, run & 0x0F
-            unpacked.extend([val] * num)
+        # Unpack Run-length encoded data: the high nibble of each byte is the
+        # length of the run, the low nibble its value
+        runs = np.frombuffer(data, dtype=np.uint8)
+        return np.repeat(runs & 0x0F, runs >> 4)
+
+    @staticmethod
+    def _unpack_rle_rows(rows):
+        # Unpack a sequence of run-length encoded rows in one go into a 2D array,
+        # rows decoding to fewer values than the longest one are padded with 0
+        runs = np.frombuffer(b''.join(rows), dtype=np.uint8)
+        run_lens = runs >> 4
+        row_ids = np.repeat(np.arange(len(rows)), [len(row) for row in rows])
+        row_lens = np.bincount(row_ids, weights=run_lens, minlength=len(rows))
+        row_lens = row_lens.astype(np.intp)
+        flat = np.repeat(runs & 0x0F, run_lens)
+        ncols = row_lens.max(initial=0)
+        if flat.size == ncols * len(rows):
+            return flat.reshape(len(rows), ncols)
+
+        unpacked = np.zeros((len(rows), ncols), dtype=np.uint8)
+        row_starts = np.cumsum(row_lens) - row_lens
+        row_inds = np.repeat(np.arange(len(rows)), row_lens)
+        unpacked[row_inds, np.arange(flat.size) - row_starts[row_inds]] = flat
         return unpacked
 
     @staticmethod
@@ -984,24 +1334,25 @@ class NEXRADLevel3File:
         blocks = [str(getattr(self, name)) for name in attrs if hasattr(self, name)]
         return self.filename + ': ' + '\n'.join(blocks)
 
+    radial_hdr_fmt = NamedStruct([('ind_first_bin', 'H'), ('nbins', 'H'),
+                                  ('i_center', 'h'), ('j_center', 'h'),
+                                  ('scale_factor', 'h'), ('num_rad', 'H')],
+                                 '>', 'RadialHeader')
+    radial_fmt = NamedStruct([('num_hwords', 'H'), ('start_angle', 'h'),
+                              ('angle_delta', 'h')], '>', 'RadialData')
+
     def _unpack_packet_radial_data(self, code, in_sym_block):
-        hdr_fmt = NamedStruct([('ind_first_bin', 'H'), ('nbins', 'H'),
-                               ('i_center', 'h'), ('j_center', 'h'),
-                               ('scale_factor', 'h'), ('num_rad', 'H')],
-                              '>', 'RadialHeader')
-        rad_fmt = NamedStruct([('num_hwords', 'H'), ('start_angle', 'h'),
-                               ('angle_delta', 'h')], '>', 'RadialData')
-        hdr = self._buffer.read_struct(hdr_fmt)
-        rads = []
+        hdr = self._buffer.read_struct(self.radial_hdr_fmt)
+        start = []
+        end = []
+        runs = []
         for _ in range(hdr.num_rad):
-            rad = self._buffer.read_struct(rad_fmt)
+            rad = self._buffer.read_struct(self.radial_fmt)
             start_az = rad.start_angle * 0.1
-            end_az = start_az + rad.angle_delta * 0.1
-            rads.append((start_az, end_az,
-                         self._unpack_rle_data(
-                             self._buffer.read_binary(2 * rad.num_hwords))))
-        start, end, vals = zip(*rads)
-        return {'start_az': list(start), 'end_az': list(end), 'data': list(vals),
+            start.append(start_az)
+            end.append(start_az + rad.angle_delta * 0.1)
+            runs.append(self._buffer.read_binary(2 * rad.num_hwords))
+        return {'start_az': start, 'end_az': end, 'data': self._unpack_rle_rows(runs),
                 'center': (hdr.i_center * self.pos_scale(in_sym_block),
                            hdr.j_center * self.pos_scale(in_sym_block)),
                 'gate_scale': hdr.scale_factor * 0.001, 'first': hdr.ind_first_bin}
@@ -1015,33 +1366,61 @@ class NEXRADLevel3File:
 
     def _unpack_packet_digital_radial(self, code, in_sym_block):
         hdr = self._buffer.read_struct(self.digital_radial_hdr_fmt)
-        rads = []
-        for _ in range(hdr.num_rad):
-            rad = self._buffer.read_struct(self.digital_radial_fmt)
-            start_az = rad.start_angle * 0.1
-            end_az = start_az + rad.angle_delta * 0.1
-            rads.append((start_az, end_az, self._buffer.read_binary(rad.num_bytes)))
-        start, end, vals = zip(*rads)
-        return {'start_az': list(start), 'end_az': list(end), 'data': list(vals),
+
+        # Radials normally all hold the same number of bytes, in which case the whole
+        # packet is a single array of fixed size records
+        rads_start = self._buffer.set_mark()
+        num_bytes = self._buffer.read_int(2, 'big', signed=False) if hdr.num_rad else 0
+        self._buffer.jump_to(rads_start)
+        rad_dtype = np.dtype(self.digital_radial_fmt.dtype.descr
+                             + [('data', 'u1', (num_bytes,))])
+        try:
+            rads = self._buffer.read_array(hdr.num_rad, rad_dtype)
+        except ValueError:
+            rads = None
+        if rads is not None and np.all(rads['num_bytes'] == num_bytes):
+            start_angle = rads['start_angle']
+            angle_delta = rads['angle_delta']
+            data = np.ascontiguousarray(rads['data'])
+        else:
+            self._buffer.jump_to(rads_start)
+            start_angle = np.empty(hdr.num_rad, dtype=np.int16)
+            angle_delta = np.empty(hdr.num_rad, dtype=np.int16)
+            rows = []
+            for i in range(hdr.num_rad):
+                rad = self._buffer.read_struct(self.digital_radial_fmt)
+                start_angle[i] = rad.start_angle
+                angle_delta[i] = rad.angle_delta
+                rows.append(self._buffer.read_binary(rad.num_bytes))
+            data = np.zeros((hdr.num_rad, max(map(len, rows), default=0)), dtype=np.uint8)
+            for row, vals in zip(data, rows):
+                row[:len(vals)] = vals
+
+        start_az = start_angle * 0.1
+        end_az = start_az + angle_delta * 0.1
+        return {'start_az': start_az.astype(np.float32), 'end_az': end_az.astype(np.float32),
+                'data': data,
                 'center': (hdr.i_center * self.pos_scale(in_sym_block),
                            hdr.j_center * self.pos_scale(in_sym_block)),
                 'gate_scale': hdr.scale_factor * 0.001, 'first': hdr.ind_first_bin}
 
+    raster_hdr_fmt = NamedStruct([('code', 'L'),
+                                  ('i_start', 'h'), ('j_start', 'h'),  # start in km/4
+                                  ('xscale_int', 'h'), ('xscale_frac', 'h'),
+                                  ('yscale_int', 'h'), ('yscale_frac', 'h'),
+                                  ('num_rows', 'h'), ('packing', 'h')], '>', 'RasterData')
+
     def _unpack_packet_raster_data(self, code, in_sym_block):
-        hdr_fmt = NamedStruct([('code', 'L'),
-                               ('i_start', 'h'), ('j_start', 'h'),  # start in km/4
-                               ('xscale_int', 'h'), ('xscale_frac', 'h'),
-                               ('yscale_int', 'h'), ('yscale_frac', 'h'),
-                               ('num_rows', 'h'), ('packing', 'h')], '>', 'RasterData')
-        hdr = self._buffer.read_struct(hdr_fmt)
+        hdr = self._buffer.read_struct(self.raster_hdr_fmt)
         assert hdr.code == 0x800000C0
         assert hdr.packing == 2
         rows = []
         for _ in range(hdr.num_rows):
             num_bytes = self._buffer.read_int(2, 'big', signed=False)
-            rows.append(self._unpack_rle_data(self._buffer.read_binary(num_bytes)))
+            rows.append(self._buffer.read_binary(num_bytes))
         return {'start_x': hdr.i_start * hdr.xscale_int,
-                'start_y': hdr.j_start * hdr.yscale_int, 'data': rows}
+                'start_y': hdr.j_start * hdr.yscale_int,
+                'data': self._unpack_rle_rows(rows)}
 
     def _unpack_packet_uniform_text(self, code, in_sym_block):
         # By not using a struct, we can handle multiple codes
@@ -1081,6 +1460,13 @@ class NEXRADLevel3File:
 
         return ret
 
+    # Fields following the position of each symbol, by packet code
+    special_graphic_symbol_fields = {3: [('radius', '>i2')], 11: [('radius', '>i2')],
+                                     25: [('radius', '>i2')], 15: [('id', 'S2')],
+                                     19: [('POH', '>i2'), ('POSH', '>i2'),
+                                          ('Max Size', '>u2')],
+                                     20: [('kind', '>u2'), ('attr', '>u2')]}
+
     def _unpack_packet_special_graphic_symbol(self, code, in_sym_block):
         type_map = {3: 'Mesocyclone', 11: '3D Correlated Shear', 12: 'TVS',
                     26: 'ETVS', 13: 'Positive Hail', 14: 'Probable Hail',
@@ -1089,40 +1475,37 @@ class NEXRADLevel3File:
                              5: 'TVS (Ext.)', 6: 'ETVS (Ext.)', 7: 'TVS',
                              8: 'ETVS', 9: 'MDA', 10: 'MDA (Elev.)', 11: 'MDA (Weak)'}
 
-        # Read the number of bytes and set a mark for sanity checking
+        # The packet is an array of fixed size records, one per symbol
         num_bytes = self._buffer.read_int(2, 'big', signed=False)
-        packet_data_start = self._buffer.set_mark()
+        sym_dtype = np.dtype([('x', '>i2'), ('y', '>i2')]
+                             + self.special_graphic_symbol_fields.get(code, []))
+        assert num_bytes % sym_dtype.itemsize == 0
+        syms = self._buffer.read_array(num_bytes // sym_dtype.itemsize, sym_dtype)
 
         scale = self.pos_scale(in_sym_block)
-
-        # Loop over the bytes we have
-        ret = defaultdict(list)
-        while self._buffer.offset_from(packet_data_start) < num_bytes:
-            # Read position
-            ret['x'].append(self._buffer.read_int(2, 'big', signed=True) * scale)
-            ret['y'].append(self._buffer.read_int(2, 'big', signed=True) * scale)
-
-            # Handle any types that have additional info
-            if code in (3, 11, 25):
-                ret['radius'].append(self._buffer.read_int(2, 'big', signed=True) * scale)
-            elif code == 15:
-                ret['id'].append(''.join(self._buffer.read_ascii(2)))
-            elif code == 19:
-                ret['POH'].append(self._buffer.read_int(2, 'big', signed=True))
-                ret['POSH'].append(self._buffer.read_int(2, 'big', signed=True))
-                ret['Max Size'].append(self._buffer.read_int(2, 'big', signed=False))
-            elif code == 20:
-                kind = self._buffer.read_int(2, 'big', signed=False)
-                attr = self._buffer.read_int(2, 'big', signed=False)
-                if kind < 5 or kind > 8:
-                    ret['radius'].append(attr * scale)
-
-                if kind not in point_feature_map:
-                    log.warning('%s: Unknown graphic symbol point kind %d/%x.',
-                                self.filename, kind, kind)
-                    ret['type'].append(f'Unknown ({kind:d})')
-                else:
-                    ret['type'].append(point_feature_map[kind])
+        ret = {'x': syms['x'].astype(np.float32) * scale,
+               'y': syms['y'].astype(np.float32) * scale}
+
+        # Handle any types that have additional info
+        if code in (3, 11, 25):
+            ret['radius'] = syms['radius'].astype(np.float32) * scale
+        elif code == 15:
+            ret['id'] = syms['id'].astype('U2')
+        elif code == 19:
+            ret['POH'] = syms['POH'].astype(np.int16)
+            ret['POSH'] = syms['POSH'].astype(np.int16)
+            ret['Max Size'] = syms['Max Size'].astype(np.uint16)
+        elif code == 20:
+            # Only some kinds of point feature have a radius, NaN for the others
+            kind = syms['kind'].astype(np.uint16)
+            ret['radius'] = np.where((kind < 5) | (kind > 8),
+                                     syms['attr'].astype(np.float32) * scale,
+                                     np.float32(np.nan))
+            for unknown in sorted(set(kind.tolist()) - point_feature_map.keys()):
+                log.warning('%s: Unknown graphic symbol point kind %d/%x.',
+                            self.filename, unknown, unknown)
+            ret['type'] = np.array([point_feature_map.get(k, f'Unknown ({k:d})')
+                                    for k in kind.tolist()], dtype=str)
 
         # Map the code to a name for this type of symbol
         if code != 20:
@@ -1133,12 +1516,6 @@ class NEXRADLevel3File:
             else:
                 ret['type'] = type_map[code]
 
-        # Check and return
-        assert self._buffer.offset_from(packet_data_start) == num_bytes
-
-        # Reduce dimensions of lists if possible
-        reduce_lists(ret)
-
         return ret
 
     def _unpack_packet_scit(self, code, in_sym_block):
@@ -1192,6 +1569,13 @@ class NEXRADLevel3File:
 
         return {'data': rows}
 
+    def _read_vectors(self, num_bytes, ncols, in_sym_block):
+        """Read num_bytes of positions as a float32 array of ncols columns, in km."""
+        pos = self._buffer.read_array(num_bytes // 2, '>i2')
+        pos = pos[:len(pos) - len(pos) % ncols].reshape(-1, ncols).astype(np.float32)
+        pos *= self.pos_scale(in_sym_block)
+        return pos
+
     def _unpack_packet_linked_vector(self, code, in_sym_block):
         num_bytes = self._buffer.read_int(2, 'big', signed=True)
         if code == 9:
@@ -1199,10 +1583,7 @@ class NEXRADLevel3File:
             num_bytes -= 2
         else:
             value = None
-        scale = self.pos_scale(in_sym_block)
-        pos = [b * scale for b in self._buffer.read_binary(num_bytes / 2, '>h')]
-        vectors = list(zip(pos[::2], pos[1::2]))
-        return {'vectors': vectors, 'color': value}
+        return {'vectors': self._read_vectors(num_bytes, 2, in_sym_block), 'color': value}
 
     def _unpack_packet_vector(self, code, in_sym_block):
         num_bytes = self._buffer.read_int(2, 'big', signed=True)
@@ -1211,10 +1592,7 @@ class NEXRADLevel3File:
             num_bytes -= 2
         else:
             value = None
-        scale = self.pos_scale(in_sym_block)
-        pos = [p * scale for p in self._buffer.read_binary(num_bytes / 2, '>h')]
-        vectors = list(zip(pos[::4], pos[1::4], pos[2::4], pos[3::4]))
-        return {'vectors': vectors, 'color': value}
+        return {'vectors': self._read_vectors(num_bytes, 4, in_sym_block), 'color': value}
 
     def _unpack_packet_contour_color(self, code, in_sym_block):
         # Check for color value indicator
@@ -1227,31 +1605,26 @@ class NEXRADLevel3File:
         # Check for initial point indicator
         assert self._buffer.read_int(2, 'big', signed=False) == 0x8000
 
-        scale = self.pos_scale(in_sym_block)
-        startx = self._buffer.read_int(2, 'big', signed=True) * scale
-        starty = self._buffer.read_int(2, 'big', signed=True) * scale
-        vectors = [(startx, starty)]
+        start = self._read_vectors(4, 2, in_sym_block)
         num_bytes = self._buffer.read_int(2, 'big', signed=False)
-        pos = [b * scale for b in self._buffer.read_binary(num_bytes / 2, '>h')]
-        vectors.extend(zip(pos[::2], pos[1::2]))
-        return {'vectors': vectors}
+        return {'vectors': np.concatenate((start,
+                                           self._read_vectors(num_bytes, 2, in_sym_block)))}
+
+    wind_barb_dtype = np.dtype([('color', '>i2'), ('x', '>i2'), ('y', '>i2'),
+                                ('direc', '>i2'), ('speed', '>i2')])
 
     def _unpack_packet_wind_barbs(self, code, in_sym_block):
-        # Figure out how much to read
+        # The packet is an array of fixed size records, one per barb
         num_bytes = self._buffer.read_int(2, 'big', signed=True)
-        packet_data_start = self._buffer.set_mark()
-        ret = defaultdict(list)
-
-        # Read while we have data, then return
-        while self._buffer.offset_from(packet_data_start) < num_bytes:
-            ret['color'].append(self._buffer.read_int(2, 'big', signed=True))
-            ret['x'].append(self._buffer.read_int(2, 'big', signed=True)
-                            * self.pos_scale(in_sym_block))
-            ret['y'].append(self._buffer.read_int(2, 'big', signed=True)
-                            * self.pos_scale(in_sym_block))
-            ret['direc'].append(self._buffer.read_int(2, 'big', signed=True))
-            ret['speed'].append(self._buffer.read_int(2, 'big', signed=True))
-        return ret
+        assert num_bytes % self.wind_barb_dtype.itemsize == 0
+        barbs = self._buffer.read_array(num_bytes // self.wind_barb_dtype.itemsize,
+                                        self.wind_barb_dtype)
+        scale = self.pos_scale(in_sym_block)
+        return {'color': barbs['color'].astype(np.int16),
+                'x': barbs['x'].astype(np.float32) * scale,
+                'y': barbs['y'].astype(np.float32) * scale,
+                'direc': barbs['direc'].astype(np.int16),
+                'speed': barbs['speed'].astype(np.int16)}
 
     def _unpack_packet_generic(self, code, in_sym_block):
         # Reserved HW
@@ -1267,6 +1640,9 @@ class NEXRADLevel3File:
         self._buffer.read_int(2, 'big', signed=True)  # number of bytes, not needed to process
         return {'times': self._read_trends()}
 
+    cell_trend_hdr_fmt = NamedStruct([('id', '2s'), ('x', 'h'), ('y', 'h')], '>',
+                                     'CellTrendHeader')
+
     def _unpack_packet_cell_trend(self, code, in_sym_block):
         code_map = ['Cell Top', 'Cell Base', 'Max Reflectivity Height',
                     'Probability of Hail', 'Probability of Severe Hail',
@@ -1275,12 +1651,19 @@ class NEXRADLevel3File:
         code_scales = [100, 100, 100, 1, 1, 1, 1, 100]
         num_bytes = self._buffer.read_int(2, 'big', signed=True)
         packet_data_start = self._buffer.set_mark()
-        cell_id = ''.join(self._buffer.read_ascii(2))
-        x = self._buffer.read_int(2, 'big', signed=True) * self.pos_scale(in_sym_block)
-        y = self._buffer.read_int(2, 'big', signed=True) * self.pos_scale(in_sym_block)
-        ret = {'id': cell_id, 'x': x, 'y': y}
-        while self._buffer.offset_from(packet_data_start) < num_bytes:
-            code = self._buffer.read_int(2, 'big', signed=True)
+        hdr = self._buffer.read_struct(self.cell_trend_hdr_fmt)
+        ret = {'id': hdr.id.decode('ascii'), 'x': hdr.x * self.pos_scale(in_sym_block),
+               'y': hdr.y * self.pos_scale(in_sym_block)}
+
+        codes, trends = self._read_trend_records(num_bytes - self.cell_trend_hdr_fmt.size)
+        if codes is None:
+            codes = []
+            trends = []
+            while self._buffer.offset_from(packet_data_start) < num_bytes:
+                codes.append(self._buffer.read_int(2, 'big', signed=True))
+                trends.append(self._read_trends())
+
+        for code, vals in zip(codes, trends):
             try:
                 ind = code - 1
                 key = code_map[ind]
@@ -1289,28 +1672,55 @@ class NEXRADLevel3File:
                 log.warning('%s: Unsupported trend code %d/%x.', self.filename, code, code)
                 key = 'Unknown'
                 scale = 1
-            vals = self._read_trends()
             if code in (1, 2):
-                ret[f'{key} Limited'] = [v > 700 for v in vals]
-                vals = [v - 1000 if v > 700 else v for v in vals]
-            ret[key] = [v * scale for v in vals]
+                limited = vals > 700
+                ret[f'{key} Limited'] = limited
+                vals = np.where(limited, vals - 1000, vals)
+            ret[key] = vals * scale
 
         return ret
 
+    def _read_trend_records(self, num_bytes):
+        """Read the trends of a cell trend packet as a single array of records.
+
+        Returns the trend codes and a 2-D array of the values, latest last, or
+        (None, None) without moving if the trends differ in number of volumes.
+        """
+        if num_bytes < 4:
+            return (None, None) if num_bytes else ([], [])
+        num_vols = self._buffer.get_next(4)[2]
+        trend_dtype = np.dtype([('code', '>i2'), ('num_vols', 'u1'), ('latest', 'u1'),
+                                ('vals', '>i2', (num_vols,))])
+        if num_bytes % trend_dtype.itemsize:
+            return None, None
+        trends = np.frombuffer(self._buffer.get_next(num_bytes), dtype=trend_dtype)
+        if np.any(trends['num_vols'] != num_vols):
+            return None, None
+        self._buffer.skip(num_bytes)
+
+        # Wrap the circular buffers so that latest is last
+        vals = trends['vals'].astype(np.int32)
+        if num_vols:
+            latest = np.where(trends['latest'] < num_vols, trends['latest'], 0)
+            inds = (np.arange(num_vols) + latest[:, None]) % num_vols
+            vals = np.take_along_axis(vals, inds, axis=1)
+        return trends['code'].tolist(), vals
+
     def _read_trends(self):
         num_vols, latest = self._buffer.read(2)
-        vals = [self._buffer.read_int(2, 'big', signed=True) for _ in range(num_vols)]
+        vals = self._buffer.read_array(num_vols, '>i2').astype(np.int32)
 
         # Wrap the circular buffer so that latest is last
-        return vals[latest:] + vals[:latest]
+        return np.concatenate((vals[latest:], vals[:latest]))
 
     packet_map = {1: _unpack_packet_uniform_text,
                   2: _unpack_packet_special_text_symbol,
                   3: _unpack_packet_special_graphic_symbol,
                   4: _unpack_packet_wind_barbs,
                   6: _unpack_packet_linked_vector,
+                  7: _unpack_packet_vector,
                   8: _unpack_packet_uniform_text,
-                  # 9: _unpack_packet_linked_vector,
+                  9: _unpack_packet_linked_vector,
                   10: _unpack_packet_vector,
                   11: _unpack_packet_special_graphic_symbol,
                   12: _unpack_packet_special_graphic_symbol,
@@ -1336,7 +1746,92 @@ class NEXRADLevel3File:
                   0xba07: _unpack_packet_raster_data}
 
 
-class Level3XDRParser(Unpacker):
+class XDRUnpacker:
+    """Unpack the XDR (RFC 4506) encoded values used by the generic Level 3 packets.
+
+    Covers the subset of the standard library's former ``xdrlib.Unpacker`` that the
+    products need, reading with precompiled structs from a view of the data.
+    """
+
+    _uint = Struct('>L')
+    _int = Struct('>l')
+    _float = Struct('>f')
+    _double = Struct('>d')
+
+    def __init__(self, data):
+        """Initialize the unpacker with the data to decode."""
+        self.reset(data)
+
+    def reset(self, data):
+        """Start unpacking new data."""
+        self._buf = memoryview(data).cast('B')
+        self._pos = 0
+
+    def get_position(self):
+        """Return the current offset in the data."""
+        return self._pos
+
+    def set_position(self, position):
+        """Move to an offset in the data."""
+        self._pos = position
+
+    def get_buffer(self):
+        """Return the data being unpacked."""
+        return self._buf.tobytes()
+
+    def done(self):
+        """Check that all the data were unpacked."""
+        if self._pos < len(self._buf):
+            raise ValueError('XDR: unextracted data remains')
+
+    def _unpack(self, fmt):
+        pos = self._pos
+        if pos + fmt.size > len(self._buf):
+            raise EOFError
+        self._pos = pos + fmt.size
+        return fmt.unpack_from(self._buf, pos)[0]
+
+    def unpack_uint(self):
+        """Unpack an unsigned 32-bit integer."""
+        return self._unpack(self._uint)
+
+    def unpack_int(self):
+        """Unpack a signed 32-bit integer."""
+        return self._unpack(self._int)
+
+    def unpack_float(self):
+        """Unpack a single precision float."""
+        return self._unpack(self._float)
+
+    def unpack_double(self):
+        """Unpack a double precision float."""
+        return self._unpack(self._double)
+
+    def unpack_fstring(self, n):
+        """Unpack n bytes of opaque data, padded to a multiple of 4 bytes."""
+        if n < 0:
+            raise ValueError('XDR: fstring size must be nonnegative')
+        start = self._pos
+        end = start + (n + 3) // 4 * 4
+        if end > len(self._buf):
+            raise EOFError
+        self._pos = end
+        return self._buf[start:start + n].tobytes()
+
+    def unpack_string(self):
+        """Unpack variable length opaque data."""
+        return self.unpack_fstring(self.unpack_uint())
+
+    def unpack_farray(self, n, unpack_item):
+        """Unpack n items with unpack_item."""
+        return [unpack_item() for _ in range(n)]
+
+    def unpack_array(self, unpack_item):
+        """Unpack a variable length array of items with unpack_item."""
+        return self.unpack_farray(self.unpack_uint(), unpack_item)
+
+
+class Level3XDRParser(XDRUnpacker):
     """Handle XDR-formatted Level 3 NEXRAD products."""
 
     def __call__(self, code):
@@ -1354,7 +1849,7 @@ class Level3XDRParser(Unpacker):
 
     def unpack_string(self):
         """Unpack the internal data as a string."""
-        return Unpacker.unpack_string(self).decode('ascii')
+        return super().unpack_string().decode('ascii')
 
     def _unpack_prod_desc(self):
         xdr = OrderedDict()
@@ -1428,32 +1923,85 @@ class Level3XDRParser(Unpacker):
 
         return ret
 
-    radial_fmt = namedtuple('RadialComponent', ['description', 'gate_width',
-                                                'first_gate', 'parameters',
-                                                'radials'])
-    radial_data_fmt = namedtuple('RadialData', ['azimuth', 'elevation', 'width',
-                                                'num_bins', 'attributes',
-                                                'data'])
+    radial_fmt = _namedtuple('RadialComponent', ['description', 'gate_width',
+                                                 'first_gate', 'parameters',
+                                                 'azimuth', 'elevation', 'width',
+                                                 'num_bins', 'attributes', 'data'])
 
     def _unpack_radial(self):
-        ret = self.radial_fmt(description=self.unpack_string(),
-                              gate_width=self.unpack_float(),
-                              first_gate=self.unpack_float(),
-                              parameters=self._unpack_parameters(),
-                              radials=None)
+        description = self.unpack_string()
+        gate_width = self.unpack_float()
+        first_gate = self.unpack_float()
+        parameters = self._unpack_parameters()
         num_rads = self.unpack_int()
-        rads = []
-        for _ in range(num_rads):
+        rads = self._unpack_radial_records(num_rads)
+        if rads is None:
+            rads = self._unpack_radial_list(num_rads)
+        azimuth, elevation, width, num_bins, attributes, data = rads
+        return self.radial_fmt(description=description, gate_width=gate_width,
+                               first_gate=first_gate, parameters=parameters,
+                               azimuth=azimuth, elevation=elevation, width=width,
+                               num_bins=num_bins, attributes=attributes, data=data)
+
+    def _unpack_radial_records(self, num_rads):
+        """Decode radials with equally sized attributes and gate arrays in one go.
+
+        Returns None if the radials differ in size, or the data are short.
+        """
+        pos = self.get_position()
+        try:
             # ICD is wrong, says num_bins is float, should be int
-            rads.append(self.radial_data_fmt(azimuth=self.unpack_float(),
-                                             elevation=self.unpack_float(),
-                                             width=self.unpack_float(),
-                                             num_bins=self.unpack_int(),
-                                             attributes=self.unpack_string(),
-                                             data=self.unpack_array(self.unpack_int)))
-        return ret._replace(radials=rads)
+            attr_len = self._uint.unpack_from(self._buf, pos + 16)[0]
+            attr_size = (attr_len + 3) // 4 * 4
+            num_gates = self._uint.unpack_from(self._buf, pos + 20 + attr_size)[0]
+            fields = [('azimuth', '>f4'), ('elevation', '>f4'), ('width', '>f4'),
+                      ('num_bins', '>i4'), ('attr_len', '>u4')]
+            if attr_size:
+                fields.append(('attributes', f'S{attr_size}'))
+            fields += [('num_gates', '>u4'), ('data', '>i4', (num_gates,))]
+            recs = np.frombuffer(self._buf, dtype=np.dtype(fields), count=num_rads,
+                                 offset=pos)
+        except (struct.error, ValueError):
+            return None
+        if np.any(recs['attr_len'] != attr_len) or np.any(recs['num_gates'] != num_gates):
+            return None
 
-    text_fmt = namedtuple('TextComponent', ['parameters', 'text'])
+        self.set_position(pos + recs.nbytes)
+        if attr_size:
+            attributes = np.char.decode(recs['attributes'], 'ascii')
+        else:
+            attributes = np.full(num_rads, '')
+        return (recs['azimuth'].astype(np.float32), recs['elevation'].astype(np.float32),
+                recs['width'].astype(np.float32), recs['num_bins'].astype(np.int32),
+                attributes, recs['data'].astype(np.int32))
+
+    def _unpack_radial_list(self, num_rads):
+        """Decode radials one at a time, padding shorter gate arrays with 0."""
+        azimuth = np.empty(num_rads, dtype=np.float32)
+        elevation = np.empty(num_rads, dtype=np.float32)
+        width = np.empty(num_rads, dtype=np.float32)
+        num_bins = np.empty(num_rads, dtype=np.int32)
+        attributes = []
+        rows = []
+        for i in range(num_rads):
+            azimuth[i] = self.unpack_float()
+            elevation[i] = self.unpack_float()
+            width[i] = self.unpack_float()
+            num_bins[i] = self.unpack_int()
+            attributes.append(self.unpack_string())
+            num_gates = self.unpack_uint()
+            pos = self.get_position()
+            if pos + 4 * num_gates > len(self._buf):
+                raise EOFError
+            rows.append(np.frombuffer(self._buf, dtype='>i4', count=num_gates, offset=pos))
+            self.set_position(pos + 4 * num_gates)
+
+        data = np.zeros((num_rads, max(map(len, rows), default=0)), dtype=np.int32)
+        for row, vals in zip(data, rows):
+            row[:len(vals)] = vals
+        return azimuth, elevation, width, num_bins, np.array(attributes, dtype=str), data
+
+    text_fmt = _namedtuple('TextComponent', ['parameters', 'text'])
 
     def _unpack_text(self):
         return self.text_fmt(parameters=self._unpack_parameters(),
@@ -1461,8 +2009,233 @@ class Level3XDRParser(Unpacker):
 
     _component_lookup = {1: _unpack_radial, 4: _unpack_text}
 
+
+class Level3StreamSplitter:
+    """Carve individual Level 3 products out of a stream of concatenated products.
+
+    Feeds (for instance satellite broadcast ones) deliver WMO-headed products back to back
+    in one byte stream. Chunks of any size are passed to `feed`, which returns the products
+    completed so far as :class:`memoryview` slices of the received data, running from the
+    WMO header to the end of the message and its trailer. Products are never copied: the
+    buffer they view is left alone and only the incomplete tail is moved to a new one.
+
+    A product starts at a match of `wmo_finder`, and the ``msg_len`` of the message header
+    that follows gives its length. The zlib frames of compressed products are inflated,
+    discarding the output, until ``msg_len`` bytes were produced to find where they end.
+    Free text messages run up to the end of transmission character. Bytes between products
+    are skipped.
+    """
+
+    _wmo_len = 64
+    _trailers = (b'\r\r\n', b'\xff\xff\n')
+
+    def __init__(self):
+        """Initialize the splitter with an empty stream."""
+        self._buf = bytearray()
+        self._pos = 0
+        self._reset_product()
+
+    def _reset_product(self):
+        self._start = None
+        self._body = None
+        self._text = False
+        self._msg_end = None
+        self._zpos = None
+        self._decomp = None
+        self._head = bytearray()
+        self._out_len = 0
+        self._needed = None
+
+    def feed(self, data):
+        """Add the next chunk of the stream and return the list of completed products."""
+        self._buf += data
+        return self._split(final=False)
+
+    def close(self):
+        """Mark the end of the stream and return the list of products it completes."""
+        products = self._split(final=True)
+        self.__init__()
+        return products
+
+    def _split(self, final):
+        products = []
+        while True:
+            end = self._find_product(final)
+            if end is None:
+                break
+            products.append(memoryview(self._buf)[self._start:end])
+            self._pos = end
+            self._reset_product()
+
+        # Views of the current buffer were handed out, so continue with a copy of the
+        # tail. Otherwise bytes before the search position can simply be dropped.
+        shift = self._start if self._start is not None else self._pos
+        if products:
+            self._buf = self._buf[shift:]
+        elif shift:
+            del self._buf[:shift]
+        self._pos -= shift
+        for name in ('_start', '_body', '_msg_end', '_zpos'):
+            if getattr(self, name) is not None:
+                setattr(self, name, getattr(self, name) - shift)
+        return products
+
+    @staticmethod
+    def _is_zlib(buf, offset):
+        """Whether a zlib stream header starts at offset."""
+        return buf[offset] & 0x0F == 8 and ((buf[offset] << 8) | buf[offset + 1]) % 31 == 0
+
+    def _find_product(self, final):
+        """Return the end of the next complete product, None if more data are needed."""
+        buf = self._buf
+        if self._start is None:
+            match = _wmo_finder_bytes.search(buf, self._pos)
+            if match is None:
+                # Nothing here, but keep what may be the beginning of a header
+                self._pos = max(self._pos, len(buf) - self._wmo_len)
+                return None
+            start = match.start()
+            if len(buf) - start < self._wmo_len and not final:
+                self._pos = start
+                return None
+
+            # Match again within the same window as the parser
+            match = _wmo_finder_bytes.match(buf, start, start + self._wmo_len) or match
+            self._start = start
+            self._body = match.end()
+            self._text = match.group(1) == b'NOUS'
+
+        if self._msg_end is None:
+            self._msg_end = self._message_end()
+            if self._msg_end is None:
+                if not final:
+                    return None
+                # Hand out whatever is left of a truncated product
+                self._msg_end = len(buf)
+
+        end = self._msg_end
+        if len(buf) < end + 4 and not final:
+            return None
+        if bytes(buf[end:end + 3]) in self._trailers:
+            end += 4
+        return min(end, len(buf))
+
+    def _message_end(self):
+        """Return the offset where the message ends, None if it is not known yet."""
+        buf = self._buf
+        body = self._body
+        if self._text:
+            etx = buf.find(b'\x03', body)
+            return etx + 1 if etx >= 0 else None
+
+        if self._zpos is None:
+            if len(buf) < body + header_fmt.size:
+                return None
+            if not self._is_zlib(buf, body):
+                return body + header_fmt.unpack_from(buf, body).msg_len
+            self._zpos = body
+            self._decomp = zlib.decompressobj()
+        return self._inflate_frames()
+
+    def _inflate_frames(self):
+        """Inflate the zlib frames received so far, return their end once complete."""
+        buf = self._buf
+        head_len = self._wmo_len + header_fmt.size
+        while True:
+            if self._decomp.eof:
+                if self._needed is not None and self._out_len >= self._needed:
+                    return self._zpos
+                if len(buf) < self._zpos + 2:
+                    return None
+                if not self._is_zlib(buf, self._zpos):
+                    return self._zpos
+                self._decomp = zlib.decompressobj()
+
+            if self._zpos >= len(buf):
+                return None
+            with memoryview(buf) as view, \
+                    view[self._zpos:self._zpos + _zlib_chunk_size] as chunk:
+                try:
+                    out = self._decomp.decompress(chunk)
+                except zlib.error:
+                    log.warning('Corrupt zlib frame in stream, ending product early.')
+                    return self._zpos
+                self._zpos += len(chunk) - len(self._decomp.unused_data)
+
+            self._out_len += len(out)
+            if len(self._head) < head_len:
+                self._head += out[:head_len - len(self._head)]
+                if self._needed is None and len(self._head) == head_len:
+                    match = wmo_finder.search(str(self._head[:self._wmo_len], 'ascii',
+                                                  'ignore'))
+                    offset = match.end() if match else 0
+                    self._needed = offset + header_fmt.unpack_from(self._head,
+                                                                   offset).msg_len
+
+
+def iter_level3_products(stream, chunk_size=65536):
+    """Yield the products of a stream of concatenated Level 3 products as they complete.
+
+    Parameters
+    ----------
+    stream : file-like, socket-like or iterable
+        Source of the stream: an object with a ``read`` or ``recv`` method, or an iterable
+        of byte chunks.
+    chunk_size : int, optional
+        Number of bytes requested per read.
+
+    Yields
+    ------
+    memoryview
+        The bytes of each product, as split by `Level3StreamSplitter`.
+
+    """
+    splitter = Level3StreamSplitter()
+    read = getattr(stream, 'read', None) or getattr(stream, 'recv', None)
+    chunks = iter(functools.partial(read, chunk_size), b'') if read else stream
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+
+def parse_level3_product(data, lazy=False):
+    """Parse a single product held in memory, see `NEXRADLevel3File`."""
+    return NEXRADLevel3File(io.BytesIO(data), lazy=lazy)
+
+
+def parse_level3_stream(stream, executor, func=parse_level3_product, copy=True,
+                        chunk_size=65536):
+    """Hand each product of a stream to a parse pool as soon as it is complete.
+
+    Parameters
+    ----------
+    stream : file-like, socket-like or iterable
+        Stream of concatenated products, see `iter_level3_products`.
+    executor : `concurrent.futures.Executor`
+        Pool running func on the products.
+    func : callable, optional
+        Called with the bytes of each product, `parse_level3_product` by default. With a
+        process pool its results must be picklable; `NEXRADLevel3File` instances are,
+        without the raw product bytes.
+    copy : bool, optional
+        Submit each product as bytes, required by process pools. With False the
+        memoryviews are submitted as they are, which only works for thread pools.
+    chunk_size : int, optional
+        Number of bytes requested per read.
+
+    Yields
+    ------
+    `concurrent.futures.Future`
+        One per product, resolving to the result of func.
+
+    """
+    for product in iter_level3_products(stream, chunk_size):
+        yield executor.submit(func, bytes(product) if copy else product)
+
+
 ij_to_km = 0.25
 wmo_finder = re.compile('((?:NX|SD|NO)US)\\d{2}[\\s\\w\\d]+\\w*(\\w{3})\r\r\n')
+_wmo_finder_bytes = re.compile(wmo_finder.pattern.encode('ascii'))
 header_fmt = NamedStruct([('code', 'H'), ('date', 'H'), ('time', 'l'),
                             ('msg_len', 'L'), ('src_id', 'h'), ('dest_id', 'h'),
                             ('num_blks', 'H')], '>', 'MsgHdr')
@@ -1,9 +1,74 @@
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import hashlib
+from multiprocessing import shared_memory
+import os
+import time
+
 import numpy as np
 # import scipy.ndimage as ndimage
 # import scipy.sparse as sparse
 
-from pyart.config import get_field_name, get_metadata
-from pyart.filters.gatefilter import GateFilter, moment_based_gate_filter
+# numba is optional, when installed the labeling and edge finding loops are
+# compiled, see set_backend
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# pyart is only needed by the Radar based wrapper (dealias_region_based) and
+# is imported there, so the array API (dealias_sweep) works without it.
+
+# range of interval splits considered when interval_splits is 'auto'
+AUTO_MIN_SPLITS = 2
+AUTO_MAX_SPLITS = 6
+
+# kernel backend selected by set_backend and the compiled kernels
+_backend = {'name': 'auto'}
+_compiled = {}
+
+
+def set_backend(name='auto'):
+    """
+    Select the implementation of the region labeling and edge finding.
+
+    Parameters
+    ----------
+    name : 'auto', 'numba' or 'python'
+        'numba' compiles the sequential labeling and edge finding loops
+        with numba, 'python' uses the pure Python/NumPy implementation and
+        'auto', the default, uses numba when it is installed.  Both backends
+        produce identical fold maps.
+
+    """
+    if name not in ('auto', 'numba', 'python'):
+        raise ValueError("unknown dealiasing backend: %s" % name)
+    if name == 'numba' and numba is None:
+        raise ImportError("the numba backend requires numba")
+    _backend['name'] = name
+
+
+def get_backend():
+    """ Return the backend in use, 'numba' or 'python'. """
+    if _backend['name'] == 'auto':
+        return 'python' if numba is None else 'numba'
+    return _backend['name']
+
+
+def _kernel(name):
+    """ Return the label_image or fef implementation of the backend. """
+    if get_backend() == 'python':
+        return {'label_image': label_image, 'fef': fef}[name]
+    if name not in _compiled:
+        loop = {'label_image': _label_image_loop, 'fef': _fef_loop,
+                'edge_network': _edge_network_loop,
+                'reduce_network': _reduce_network_loop}[name]
+        _compiled[name] = numba.njit(cache=True)(loop)
+    if name == 'fef':
+        return _fef_compiled
+    return _compiled[name]
+
 
 def label_image(arr):
     arr = np.asarray(arr)
@@ -18,10 +83,10 @@ def label_image(arr):
             # if the pixel is true and has not been labeled yet
             if arr[i, j] and labels[i, j] == 0:
                 # perform a breadth-first search to label the connected component
-                queue = [(i, j)]
+                queue = deque([(i, j)])
                 while queue:
                     # pop the next pixel off the queue
-                    row, col = queue.pop(0)
+                    row, col = queue.popleft()
                     # label the pixel
                     labels[row, col] = label_count
                     # add neighboring pixels to the queue
@@ -45,6 +110,8 @@ def label_image(arr):
 
 def _parse_fields(vel_field, corr_vel_field):
     """Parse and return the radar fields for dealiasing."""
+    from pyart.config import get_field_name
+
     if vel_field is None:
         vel_field = get_field_name("velocity")
     if corr_vel_field is None:
@@ -68,6 +135,8 @@ def _parse_nyquist_vel(nyquist_vel, radar, check_uniform):
 
 def _parse_gatefilter(gatefilter, radar, **kwargs):
     """Parse the gatefilter, return a valid GateFilter object."""
+    from pyart.filters.gatefilter import GateFilter, moment_based_gate_filter
+
     # parse the gatefilter parameter
     if gatefilter is None:  # create a moment based filter
         gatefilter = moment_based_gate_filter(radar, **kwargs)
@@ -92,7 +161,10 @@ def dealias_region_based(
         radar, interval_splits=3, interval_limits=None,
         skip_between_rays=100, skip_along_ray=100, centered=True,
         nyquist_vel=None, gatefilter=None, rays_wrap_around=None,
-        keep_original=True, vel_field=None, corr_vel_field=None, **kwargs):
+        keep_original=True, vel_field=None, corr_vel_field=None,
+        n_workers=None, reference=None, max_memory=None, stats_hook=None,
+        return_stats=False, fold_map=False, region_budget=6000, cache=None,
+        **kwargs):
     """
     Dealias Doppler velocities using a region based algorithm.
 
@@ -101,17 +173,21 @@ def dealias_region_based(
     regions are unfolded.  Unfolding and merging regions is accomplished by
     modeling the problem as a dynamic network reduction.
 
+    This is a thin Py-ART compatible layer on top of the same per sweep
+    algorithm used by :py:func:`dealias_sweep`.
+
     Parameters
     ----------
     radar : Radar
         Radar object containing Doppler velocities to dealias.
-    interval_splits : int, optional
+    interval_splits : int or 'auto', optional
         Number of segments to split the nyquist interval into when finding
         regions of similar velocity.  More splits creates a larger number of
         initial regions which takes longer to process but may result in better
         dealiasing.  The default value of 3 seems to be a good compromise
         between performance and artifact free dealiasing.  This value
-        is not used if the interval_limits parameter is not None.
+        is not used if the interval_limits parameter is not None.  'auto'
+        chooses the number of splits of each sweep, see region_budget.
     interval_limits : array like or None, optional
         Velocity limits used for finding regions of similar velocity.  Should
         cover the entire nyquist interval.  None, the default value, will
@@ -155,25 +231,76 @@ def dealias_region_based(
     corr_vel_field : str, optional
         Name to use for the dealiased Doppler velocity field metadata.  None
         will use the default field name from the Py-ART configuration file.
+    n_workers : int or None, optional
+        Number of processes used to dealias the sweeps in parallel.  The
+        velocities, gate filter and fold numbers are shared with the workers
+        through shared memory.  None or 1 dealiases the sweeps serially.
+    reference : list, DealiasFolds or None, optional
+        Warm start the dealiasing from a previous volume.  One entry per
+        sweep, each either the dealiased velocities of the previous volume at
+        the same target angle, a :py:class:`DealiasFolds` or masked integer
+        fold map of that sweep or None when no reference is available.  The
+        DealiasFolds of a whole volume (fold_map=True) may be given instead
+        of the list.  Every unmasked gate of an integer fold map is taken as
+        valid, so the gates it excludes must be masked.  Regions are given
+        the fold number of the reference and only the regions which disagree
+        with it are resolved by the network reduction.  None, the default,
+        dealiases every sweep from scratch.
+    max_memory : int or None, optional
+        Approximate number of bytes available to dealias a single sweep.
+        Sweeps estimated to need more are split into azimuth sectors which
+        are dealiased independently and then unfolded relative to each other
+        using the regions along the sector boundaries.  None, the default,
+        dealiases each sweep as a whole.
+    stats_hook : callable or None, optional
+        Function called with the :py:class:`DealiasStats` of each sweep once
+        the sweep has been dealiased, for example to log the stage timings.
+    return_stats : bool, optional
+        True to also return the :py:class:`DealiasStats` of every sweep.
+    fold_map : bool, optional
+        True to return a :py:class:`DealiasFolds` holding the number of
+        folds of each gate as int8 instead of the dealiased velocity field.
+        The dealiased velocities are only computed if requested from it.
+    region_budget : int or None, optional
+        Number of regions a sweep may be split into when interval_splits is
+        'auto'.  The most splits, up to AUTO_MAX_SPLITS, estimated to stay
+        within the budget are used, or when none does the splits (down to
+        AUTO_MIN_SPLITS) estimated to give the fewest regions.  The default
+        keeps busy super resolution sweeps, which have 4000 to 5500 regions
+        with 3 splits, at the split count with the fewest regions.  None
+        sets no budget, always using AUTO_MAX_SPLITS.  The choices are
+        recorded in the result and in the :py:class:`DealiasStats` of each
+        sweep.
+    cache : DealiasCache or None, optional
+        Cache of fold maps.  Sweeps whose velocities, gate filter, reference
+        and parameters were dealiased before are taken from the cache, with
+        the splits and skips used for them, the fold maps of the other
+        sweeps are added to it.
 
     Returns
     -------
-    corr_vel : dict
+    corr_vel : dict or DealiasFolds
         Field dictionary containing dealiased Doppler velocities.  Dealiased
-        array is stored under the 'data' key.
+        array is stored under the 'data' key.  When interval_splits is
+        'auto' the number of splits and the skips used for each sweep are
+        stored as lists under the 'interval_splits', 'skip_between_rays'
+        and 'skip_along_ray' keys.  A DealiasFolds, whose params hold the
+        choices of each sweep, when fold_map is True.
+    stats : list of DealiasStats
+        Statistics of each sweep, only returned when return_stats is True.
 
     """
+    from pyart.config import get_metadata
+
     # parse function parameters
     vel_field, corr_vel_field = _parse_fields(vel_field, corr_vel_field)
     gatefilter = _parse_gatefilter(gatefilter, radar, **kwargs)
     rays_wrap_around = _parse_rays_wrap_around(rays_wrap_around, radar)
     nyquist_vel = _parse_nyquist_vel(nyquist_vel, radar, True)[0]
     nyquist_interval = 2. * nyquist_vel
-
-    # find nyquist interval segmentation limits
-    if interval_limits is None:
-        interval_limits = np.linspace(
-            -nyquist_vel, nyquist_vel, interval_splits+1, endpoint=True)
+    interval_limits = _parse_interval_limits(
+        interval_limits, interval_splits, nyquist_vel)
+    _check_region_budget(region_budget)
 
     # exclude masked and invalid velocity gates
     gatefilter.exclude_masked(vel_field)
@@ -182,63 +309,1112 @@ def dealias_region_based(
 
     # perform dealiasing
     vdata = radar.fields[vel_field]['data'].view(np.ndarray)
-    data = vdata.copy()     # dealiased velocities
 
-    for sweep_slice in radar.iter_slice():      # loop over sweeps
+    sweep_params = dict(
+        nyquist_interval=nyquist_interval, interval_limits=interval_limits,
+        rays_wrap_around=rays_wrap_around,
+        skip_between_rays=skip_between_rays, skip_along_ray=skip_along_ray,
+        centered=centered, max_memory=max_memory,
+        region_budget=region_budget)
+    sweep_slices = list(radar.iter_slice())
+    ref_folds, ref_valid = _parse_reference(
+        reference, vdata, sweep_slices, nyquist_interval)
+    auto_splits = interval_limits is None
+    collect_stats = (return_stats or stats_hook is not None or auto_splits
+                     or fold_map or cache is not None)
+    nsweeps = len(sweep_slices)
+    sweep_folds = [None] * nsweeps
+    all_stats = [DealiasStats(nsweep) if collect_stats else None
+                 for nsweep in range(nsweeps)]
+
+    # take the sweeps dealiased before from the cache
+    keys = [None] * nsweeps
+    if cache is not None:
+        for nsweep, sweep_slice in enumerate(sweep_slices):
+            sweep_ref = ()
+            if ref_folds is not None:
+                sweep_ref = (ref_folds[sweep_slice], ref_valid[sweep_slice])
+            keys[nsweep] = cache.fingerprint(
+                vdata[sweep_slice], gfilter[sweep_slice], sweep_params,
+                *sweep_ref)
+            sweep_folds[nsweep], params = cache.get(
+                keys[nsweep], return_params=True)
+            if sweep_folds[nsweep] is not None:
+                all_stats[nsweep].shape = vdata[sweep_slice].shape
+                all_stats[nsweep].cache_hit = True
+                all_stats[nsweep].record_params(**params)
+    todo = [nsweep for nsweep in range(nsweeps)
+            if sweep_folds[nsweep] is None]
+
+    if n_workers is not None and n_workers > 1 and len(todo) > 1:
+        folds, todo_stats = _dealias_sweeps_parallel(
+            vdata, gfilter, [sweep_slices[nsweep] for nsweep in todo],
+            sweep_params, n_workers, ref_folds, ref_valid, collect_stats)
+        for nsweep, stats in zip(todo, todo_stats):
+            sweep_folds[nsweep] = folds[sweep_slices[nsweep]]
+            if collect_stats:
+                stats.sweep = nsweep
+                all_stats[nsweep] = stats
+    else:
+        for nsweep in todo:      # loop over sweeps
+            sweep_slice = sweep_slices[nsweep]
+            sweep_ref = {}
+            if ref_folds is not None:
+                sweep_ref = dict(ref_folds=ref_folds[sweep_slice],
+                                 ref_valid=ref_valid[sweep_slice])
+            sweep_folds[nsweep] = _dealias_sweep_folds(
+                vdata[sweep_slice], gfilter[sweep_slice], **sweep_params,
+                **sweep_ref, stats=all_stats[nsweep])
+    if cache is not None:
+        for nsweep in todo:
+            cache.put(keys[nsweep], sweep_folds[nsweep],
+                      all_stats[nsweep].params)
+
+    if fold_map:
+        data = np.zeros(vdata.shape, dtype=np.int8)     # gate folds
+    else:
+        data = vdata.copy()     # dealiased velocities
+    for sweep_slice, folds, stats in zip(
+            sweep_slices, sweep_folds, all_stats):
+        with DealiasStats.timer(stats, 'apply_folds'):
+            if fold_map:
+                data[sweep_slice] = _as_int8_folds(folds)
+            else:
+                _apply_folds(data[sweep_slice], folds, nyquist_interval)
+        if stats_hook is not None:
+            stats_hook(stats)
+
+    if fold_map:
+        corr_vel = DealiasFolds(
+            data, radar.fields[vel_field]['data'], gfilter,
+            nyquist_interval, keep_original,
+            [stats.params for stats in all_stats])
+    else:
+        data = _finalize_corrected(
+            data, gfilter, radar.fields[vel_field]['data'], keep_original)
+
+        # return field dictionary containing dealiased Doppler velocities
+        corr_vel = get_metadata(corr_vel_field)
+        corr_vel['data'] = data
+        if auto_splits:
+            for name in DealiasStats.PARAMS:
+                corr_vel[name] = [getattr(stats, name) for stats in all_stats]
+    if return_stats:
+        return corr_vel, all_stats
+    return corr_vel
+
+
+def dealias_sweep(
+        velocity, nyquist, gate_mask=None, rays_wrap_around=True,
+        interval_splits=3, interval_limits=None, skip_between_rays=100,
+        skip_along_ray=100, centered=True, keep_original=True,
+        reference=None, max_memory=None, stats_hook=None, fold_map=False,
+        region_budget=6000, cache=None, return_params=False):
+    """
+    Dealias the Doppler velocities of a single sweep.
+
+    Same region based algorithm as :py:func:`dealias_region_based` but
+    operating on plain (masked) arrays, so Py-ART is not required.
+
+    Parameters
+    ----------
+    velocity : 2D array or masked array
+        Doppler velocities of the sweep, shaped (nrays, ngates).  Masked and
+        non-finite gates are excluded from dealiasing.
+    nyquist : float
+        Nyquist velocity in the same units as velocity.
+    gate_mask : 2D array of bool or None, optional
+        Additional gates to exclude from dealiasing, True indicates the gate
+        is excluded.  None only excludes masked and invalid gates.
+    rays_wrap_around : bool, optional
+        True when the first and last rays of the sweep are connected (PPI
+        scans).
+    interval_splits, interval_limits : optional
+        See :py:func:`dealias_region_based`.
+    skip_between_rays, skip_along_ray, centered : optional
+        See :py:func:`dealias_region_based`.
+    keep_original, max_memory, region_budget : optional
+        See :py:func:`dealias_region_based`.
+    reference : 2D array, DealiasFolds or None, optional
+        Dealiased velocities, DealiasFolds or masked integer fold map of the
+        same sweep from the previous volume, used to warm start the
+        dealiasing.  See :py:func:`dealias_region_based`.
+    stats_hook : callable or None, optional
+        Function called with the :py:class:`DealiasStats` of the sweep.
+    fold_map : bool, optional
+        True to return a :py:class:`DealiasFolds` rather than the dealiased
+        velocities.  Its params hold the splits and skips used.
+    cache : DealiasCache or None, optional
+        Cache of fold maps, see :py:func:`dealias_region_based`.
+    return_params : bool, optional
+        True to also return the splits and skips used, useful when
+        interval_splits is 'auto'.
+
+    Returns
+    -------
+    corr_vel : ndarray, masked array or DealiasFolds
+        Dealiased Doppler velocities, masked where gates were excluded.
+    params : dict
+        Number of 'interval_splits', 'skip_between_rays' and
+        'skip_along_ray' used, only returned when return_params is True.
 
-        # extract sweep data
-        sdata = vdata[sweep_slice].copy()   # is a copy needed here?
-        scorr = data[sweep_slice]
-        sfilter = gfilter[sweep_slice]
+    """
+    vdata, gfilter = _parse_velocity(velocity, gate_mask)
+    nyquist_interval = 2. * nyquist
+    interval_limits = _parse_interval_limits(
+        interval_limits, interval_splits, nyquist)
+    _check_region_budget(region_budget)
+
+    sweep_params = dict(
+        nyquist_interval=nyquist_interval, interval_limits=interval_limits,
+        rays_wrap_around=rays_wrap_around,
+        skip_between_rays=skip_between_rays, skip_along_ray=skip_along_ray,
+        centered=centered, max_memory=max_memory,
+        region_budget=region_budget)
+    sweep_ref = {}
+    if reference is not None:
+        ref_folds, ref_valid = _reference_folds(
+            reference, vdata, nyquist_interval)
+        sweep_ref = dict(ref_folds=ref_folds, ref_valid=ref_valid)
+
+    stats = DealiasStats()
+    folds = None
+    if cache is not None:
+        key = cache.fingerprint(
+            vdata, gfilter, sweep_params, *sweep_ref.values())
+        folds, params = cache.get(key, return_params=True)
+        if folds is not None:
+            stats.shape = vdata.shape
+            stats.cache_hit = True
+            stats.record_params(**params)
+    if folds is None:
+        folds = _dealias_sweep_folds(
+            vdata, gfilter, **sweep_params, **sweep_ref, stats=stats)
+        if cache is not None:
+            cache.put(key, folds, stats.params)
+    with DealiasStats.timer(stats, 'apply_folds'):
+        if fold_map:
+            data = _as_int8_folds(folds)
+        else:
+            data = vdata.copy()
+            _apply_folds(data, folds, nyquist_interval)
+    if stats_hook is not None:
+        stats_hook(stats)
+    if fold_map:
+        corr_vel = DealiasFolds(
+            data, velocity, gfilter, nyquist_interval, keep_original,
+            stats.params)
+    else:
+        corr_vel = _finalize_corrected(data, gfilter, velocity, keep_original)
+    if return_params:
+        return corr_vel, stats.params
+    return corr_vel
 
-        # find regions in original data
-        labels, nfeatures = _find_regions(sdata, sfilter, interval_limits)
-        bincount = np.bincount(labels.ravel())
-        num_masked_gates = bincount[0]
-        region_sizes = bincount[1:]
 
-        # find all edges between regions
+def dealias_level2_sweep(nfile, scan, max_ngates=None, gate_mask=None,
+                         filter_kwargs=None, **kwargs):
+    """
+    Dealias the velocities of one scan of a NEXRADLevel2File.
+
+    Parameters
+    ----------
+    nfile : NEXRADLevel2File
+        Level 2 file to read the velocities and Nyquist velocity from.
+    scan : int
+        Scan (0 based) to dealias.
+    max_ngates : int or None, optional
+        Number of gates to read, None uses the number of velocity gates in
+        the scan.
+    gate_mask : 2D array of bool, None or False, optional
+        Gates to exclude from dealiasing, see :py:func:`dealias_sweep`.
+        None, the default, uses the moment based gate filter of the scan
+        from NEXRADLevel2File.get_gate_filter.  False only excludes masked
+        velocities.
+    filter_kwargs : dict or None, optional
+        Thresholds passed to NEXRADLevel2File.get_gate_filter when
+        gate_mask is None.
+    kwargs
+        Additional arguments passed to :py:func:`dealias_sweep`.
+
+    Returns
+    -------
+    corr_vel : masked array
+        Dealiased Doppler velocities of the scan.
+
+    """
+    if max_ngates is None:
+        max_ngates = nfile.get_ngates(scan, "VEL")
+    velocity = nfile.get_data("VEL", max_ngates, scans=[scan])
+    nyquist = float(nfile.get_nyquist_vel([scan])[0])
+    if gate_mask is None:
+        if filter_kwargs is None:
+            filter_kwargs = {}
+        gate_mask = nfile.get_gate_filter(
+            scan, "VEL", max_ngates=max_ngates, **filter_kwargs)
+    elif gate_mask is False:
+        gate_mask = None
+    return dealias_sweep(velocity, nyquist, gate_mask=gate_mask, **kwargs)
+
+
+class DealiasFolds(object):
+    """
+    Compact result of dealiasing, the number of folds of each gate.
+
+    Only the fold map is computed by the dealiasing, one byte per gate.  The
+    dealiased velocities are materialized on first access of the corrected
+    attribute and cached.
+
+    Parameters
+    ----------
+    folds : ndarray
+        Number of Nyquist intervals to add to each gate, int8.  Zero for
+        excluded gates.
+    velocity : ndarray or masked array
+        Original Doppler velocities, referenced rather than copied.
+    gate_filter : ndarray
+        Gates excluded from dealiasing, True for excluded gates.
+    nyquist_interval : float
+        Twice the Nyquist velocity.
+    keep_original : bool
+        True to keep the original velocities of the excluded gates in the
+        corrected velocities, False to mask them.
+    params : dict, list of dict or None
+        Number of 'interval_splits', 'skip_between_rays' and
+        'skip_along_ray' the folds were found with, a list with the
+        parameters of each sweep for a volume.
+
+    """
+
+    def __init__(self, folds, velocity, gate_filter, nyquist_interval,
+                 keep_original=True, params=None):
+        """ initialize. """
+        self.folds = folds
+        self.velocity = velocity
+        self.gate_filter = gate_filter
+        self.nyquist_interval = nyquist_interval
+        self.keep_original = keep_original
+        self.params = params
+        self._corrected = None
+
+    @property
+    def corrected(self):
+        """ Dealiased Doppler velocities, masked where gates are excluded. """
+        if self._corrected is None:
+            data = np.ma.getdata(self.velocity).copy()
+            _apply_folds(data, self.folds, self.nyquist_interval)
+            self._corrected = _finalize_corrected(
+                data, self.gate_filter, self.velocity, self.keep_original)
+        return self._corrected
+
+
+class DealiasStats(object):
+    """
+    Statistics collected while dealiasing a single sweep.
+
+    Attributes
+    ----------
+    sweep : int or None
+        Sweep number within the volume, None for a lone sweep.
+    shape : tuple
+        Number of rays and gates in the sweep.
+    n_tiles : int
+        Number of azimuth sectors the sweep was dealiased in.
+    timings : dict
+        Wall time in seconds spent in each stage: 'find_regions',
+        'edge_sum_and_count', 'tracker_construction', 'merge_loop' and
+        'apply_folds'.  Stages run once per sector when the sweep is tiled,
+        the times of all sectors are summed.
+    n_regions : int
+        Number of regions of similar velocity found.
+    n_edges : int
+        Number of edges between regions (or warm started nodes).
+    n_merges : int
+        Number of region merges performed by the network reduction.
+    array_bytes : dict
+        Largest size in bytes of the 'labels' array, the raw 'edges' found
+        between gates and the summed 'region_edges' of the network.
+    interval_splits, skip_between_rays, skip_along_ray : int
+        Parameters the regions were found and joined with, the smallest of
+        all sectors when the sweep is tiled.
+    cache_hit : bool
+        True when the fold map was taken from a :py:class:`DealiasCache`,
+        only the fold application is then timed.
+
+    """
+
+    STAGES = ('find_regions', 'edge_sum_and_count', 'tracker_construction',
+              'merge_loop', 'apply_folds')
+    PARAMS = ('interval_splits', 'skip_between_rays', 'skip_along_ray')
+
+    def __init__(self, sweep=None):
+        """ initialize. """
+        self.sweep = sweep
+        self.shape = None
+        self.n_tiles = 1
+        self.timings = dict.fromkeys(self.STAGES, 0.)
+        self.n_regions = 0
+        self.n_edges = 0
+        self.n_merges = 0
+        self.array_bytes = {'labels': 0, 'edges': 0, 'region_edges': 0}
+        self.interval_splits = None
+        self.skip_between_rays = None
+        self.skip_along_ray = None
+        self.cache_hit = False
+
+    @property
+    def total_time(self):
+        """ Wall time in seconds spent in all stages. """
+        return sum(self.timings.values())
+
+    @staticmethod
+    @contextmanager
+    def timer(stats, stage):
+        """ Add the time spent in the block to a stage, stats may be None. """
+        if stats is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.timings[stage] += time.perf_counter() - start
+
+    @property
+    def params(self):
+        """ Splits and skips used, as a dict keyed by PARAMS. """
+        return {name: getattr(self, name) for name in self.PARAMS}
+
+    def record_params(self, interval_splits=None, skip_between_rays=None,
+                      skip_along_ray=None):
+        """ Record the parameters used, keeping the smallest of each. """
+        for name, value in zip(self.PARAMS, (interval_splits,
+                                             skip_between_rays,
+                                             skip_along_ray)):
+            current = getattr(self, name)
+            if value is not None and (current is None or value < current):
+                setattr(self, name, value)
+
+    def record_bytes(self, name, *arrays):
+        """ Record the size of a set of arrays if it is the largest yet. """
+        nbytes = sum(arr.nbytes for arr in arrays)
+        self.array_bytes[name] = max(self.array_bytes[name], nbytes)
+
+    def __repr__(self):
+        timings = ', '.join(
+            '%s=%.3fs' % (stage, self.timings[stage]) for stage in self.STAGES)
+        return ('<DealiasStats sweep=%s regions=%d edges=%d merges=%d '
+                'tiles=%d %s>' % (self.sweep, self.n_regions, self.n_edges,
+                                  self.n_merges, self.n_tiles, timings))
+
+
+class DealiasCache(object):
+    """
+    Cache of dealiased fold maps keyed by a fingerprint of the sweep.
+
+    Fold maps are stored as int8, one byte per gate, together with the
+    splits and skips they were found with, in an in memory least recently
+    used tier and optionally in a directory on disk which outlives the
+    process and can be shared between processes.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Number of fold maps kept in memory.
+    directory : str or None, optional
+        Directory in which fold maps are also stored, one <key>.npz file
+        per sweep holding the int8 'folds' array and the 'splits' and
+        'skips' scalars, None keeps them in memory only.
+
+    """
+
+    def __init__(self, maxsize=64, directory=None):
+        """ initialize. """
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(velocity, gate_filter, params, *arrays):
+        """
+        Return the hex digest identifying a sweep, its gate filter, the
+        dealiasing parameters and any additional (reference) arrays.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        velocity = np.ascontiguousarray(velocity)
+        digest.update(repr((velocity.shape, velocity.dtype.str)).encode())
+        digest.update(velocity)
+        digest.update(np.packbits(gate_filter))
+        for name in sorted(params):
+            value = params[name]
+            if isinstance(value, np.ndarray):
+                value = (value.dtype.str, value.tolist())
+            digest.update(repr((name, value)).encode())
+        for arr in arrays:
+            digest.update(np.ascontiguousarray(arr))
+        return digest.hexdigest()
+
+    def get(self, key, return_params=False):
+        """
+        Return the fold map stored under key, None when not cached.  With
+        return_params also return the dict of splits and skips stored with
+        it (empty when not cached).
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        elif self.directory is not None:
+            path = self._path(key)
+            if os.path.exists(path):
+                with np.load(path) as npz:
+                    folds = npz['folds']
+                    params = {name: int(npz[name]) for name in
+                              DealiasStats.PARAMS if name in npz}
+                folds.flags.writeable = False
+                entry = (folds, params)
+                self._remember(key, entry)
+        if entry is None:
+            self.misses += 1
+            entry = (None, {})
+        else:
+            self.hits += 1
+        if return_params:
+            return entry[0], dict(entry[1])
+        return entry[0]
+
+    def put(self, key, folds, params=None):
+        """
+        Store a fold map under key, with the dict of splits and skips it
+        was found with.
+        """
+        folds = _as_int8_folds(folds)
+        folds.flags.writeable = False
+        params = {name: value for name, value in (params or {}).items()
+                  if value is not None}
+        self._remember(key, (folds, params))
+        if self.directory is not None:
+            # write to a temporary file first so readers never see a
+            # partial fold map
+            tmp_path = '%s.%d.tmp' % (self._path(key), os.getpid())
+            with open(tmp_path, 'wb') as fh:
+                np.savez(fh, folds=folds, **params)
+            os.replace(tmp_path, self._path(key))
+
+    def clear(self):
+        """ Empty the in memory tier, fold maps on disk are kept. """
+        self._memory.clear()
+
+    def _remember(self, key, entry):
+        """ Add a fold map to the in memory tier, evicting the oldest. """
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        """ Path of the fold map stored under key on disk. """
+        return os.path.join(self.directory, key + '.npz')
+
+    def __len__(self):
+        return len(self._memory)
+
+
+def _parse_velocity(velocity, gate_mask):
+    """Return the velocity data and the gates excluded from dealiasing."""
+    vdata = np.ma.getdata(velocity)
+    gfilter = np.ma.getmaskarray(velocity) | ~np.isfinite(vdata)
+    if gate_mask is not None:
+        gfilter = gfilter | np.asarray(gate_mask, dtype=bool)
+    return vdata, gfilter
+
+
+def _parse_interval_limits(interval_limits, interval_splits, nyquist_vel):
+    """
+    Find the nyquist interval segmentation limits, None when the number of
+    splits is chosen for each sweep.
+    """
+    if interval_limits is None and interval_splits == 'auto':
+        return None
+    if interval_limits is None:
+        interval_limits = np.linspace(
+            -nyquist_vel, nyquist_vel, interval_splits+1, endpoint=True)
+    return interval_limits
+
+
+def _check_region_budget(region_budget):
+    """Raise a ValueError unless region_budget is None or a positive int."""
+    if region_budget is not None and (
+            isinstance(region_budget, bool) or
+            not isinstance(region_budget, (int, np.integer)) or
+            region_budget < 1):
+        raise ValueError('region_budget must be a positive integer or None, '
+                         'not %r' % (region_budget,))
+
+
+def _parse_reference(reference, vdata, sweep_slices, nyquist_interval):
+    """
+    Parse the per sweep warm start references of a volume.
+
+    Returns the reference fold number of every gate and whether it is valid,
+    or None, None when no reference was provided.
+    """
+    if reference is None:
+        return None, None
+    if isinstance(reference, DealiasFolds):
+        reference = [_masked_folds(reference, sweep_slice)
+                     for sweep_slice in sweep_slices]
+    if len(reference) != len(sweep_slices):
+        raise ValueError('reference must have one entry per sweep')
+    ref_folds = np.zeros(vdata.shape, dtype=np.int32)
+    ref_valid = np.zeros(vdata.shape, dtype=bool)
+    for sweep_slice, sweep_ref in zip(sweep_slices, reference):
+        if sweep_ref is None:
+            continue
+        ref_folds[sweep_slice], ref_valid[sweep_slice] = _reference_folds(
+            sweep_ref, vdata[sweep_slice], nyquist_interval)
+    return ref_folds, ref_valid
+
+
+def _reference_folds(reference, sdata, nyquist_interval):
+    """
+    Return the fold number of each gate implied by a sweep reference.
+
+    The reference is either a DealiasFolds, an integer fold map, masked
+    where it has no folds, or dealiased velocities.
+    """
+    if isinstance(reference, DealiasFolds):
+        reference = _masked_folds(reference)
+    valid = ~np.ma.getmaskarray(reference)
+    reference = np.ma.getdata(reference)
+    if reference.shape != sdata.shape:
+        raise ValueError('reference shape %s does not match the sweep %s' %
+                         (reference.shape, sdata.shape))
+    if np.issubdtype(reference.dtype, np.integer):
+        folds = reference.astype(np.int32)
+    else:
+        valid &= np.isfinite(reference) & np.isfinite(sdata)
+        folds = np.zeros(sdata.shape, dtype=np.int32)
+        folds[valid] = np.round(
+            (reference[valid] - sdata[valid]) / nyquist_interval)
+    return folds, valid
+
+
+def _masked_folds(folds, sweep_slice=slice(None)):
+    """ Fold map of a DealiasFolds, masked where gates were excluded. """
+    return np.ma.array(folds.folds[sweep_slice],
+                       mask=folds.gate_filter[sweep_slice])
+
+
+def _warm_start_regions(labels, nfeatures, indices, edge_count, velos,
+                        ref_folds, ref_valid, nyquist_interval):
+    """
+    Seed the region unwrap numbers from a reference fold map.
+
+    Each region is unwrapped by the average fold number of the reference
+    over the region.  Seeded regions joined by an edge whose velocities agree
+    after unwrapping are merged into a single node, so only the nodes which
+    disagree are left for the network reduction.
+
+    Returns the seed unwrap number of each region, the node each region
+    belongs to (0 for the masked region) and the edges between the nodes.
+    """
+    # average reference fold number of each region
+    in_ref = ref_valid & (labels != 0)
+    ref_count = np.bincount(labels[in_ref], minlength=nfeatures+1)
+    ref_sum = np.bincount(labels[in_ref], weights=ref_folds[in_ref],
+                          minlength=nfeatures+1)
+    seeded = ref_count > 0
+    seeded[0] = False
+    seed = np.zeros(nfeatures+1, dtype=np.int32)
+    seed[seeded] = np.round(ref_sum[seeded] / ref_count[seeded])
+
+    # unwrap the edges of the seeded regions
+    index1, index2 = indices
+    vel1, vel2 = velos
+    vel1 = vel1 + edge_count * seed[index1] * nyquist_interval
+    vel2 = vel2 + edge_count * seed[index2] * nyquist_interval
+
+    # merge the seeded regions which agree across an edge
+    diff = np.round((vel1 - vel2) / nyquist_interval / edge_count)
+    agree = seeded[index1] & seeded[index2] & (diff == 0)
+    parent = np.arange(nfeatures+1)
+    for i, j in zip(index1[agree], index2[agree]):
+        root_i = _find_root(parent, i)
+        root_j = _find_root(parent, j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    roots = np.array([_find_root(parent, i) for i in range(nfeatures+1)])
+    _, nodes = np.unique(roots, return_inverse=True)
+    nodes = nodes.astype(np.int32)
+
+    # edges between the merged nodes
+    node1 = nodes[index1]
+    node2 = nodes[index2]
+    between = node1 != node2
+    node_indices, node_count, node_velos = _sum_duplicate_edges(
+        node1[between], node2[between], edge_count[between],
+        vel1[between], vel2[between])
+    return seed, nodes, node_indices, node_count, node_velos
+
+
+def _find_root(parent, i):
+    """ Find the root of a node in a union-find forest, compressing paths. """
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def _dealias_sweep_folds(sdata, sfilter, nyquist_interval, interval_limits,
+                         rays_wrap_around, skip_between_rays, skip_along_ray,
+                         centered, ref_folds=None, ref_valid=None,
+                         max_memory=None, stats=None, region_budget=None):
+    """
+    Dealias a single sweep, return the number of folds for each gate.
+
+    Excluded gates have zero folds.  When reference folds are given the
+    regions are warm started from them.  Sweeps needing more than
+    max_memory bytes are dealiased in azimuth sectors.  Stage timings and
+    counts are added to stats when it is not None.  interval_limits of None
+    chooses the number of splits from region_budget.
+    """
+    n_tiles = _number_of_tiles(sfilter, max_memory)
+    if stats is not None:
+        stats.shape = sdata.shape
+        stats.n_tiles = n_tiles
+    if n_tiles > 1:
+        return _dealias_sweep_folds_tiled(
+            sdata, sfilter, n_tiles, nyquist_interval, interval_limits,
+            rays_wrap_around, skip_between_rays, skip_along_ray, centered,
+            ref_folds, ref_valid, stats, region_budget)
+
+    labels, region_sizes, unwrap_number, _ = _dealias_regions(
+        sdata, sfilter, nyquist_interval, interval_limits, rays_wrap_around,
+        skip_between_rays, skip_along_ray, ref_folds, ref_valid, stats,
+        region_budget)
+
+    # center sweep if requested, determine a global sweep unfold number
+    # so that the average number of gate folds is zero.
+    if centered:
+        gates_dealiased = region_sizes.sum()
+        total_folds = np.sum(region_sizes * unwrap_number[1:])
+        sweep_offset = int(round(float(total_folds) / gates_dealiased))
+        if sweep_offset != 0:
+            unwrap_number -= sweep_offset
+
+    # label 0 is the masked region, which is never unfolded
+    unwrap_number[0] = 0
+    return unwrap_number[labels]
+
+
+def _dealias_regions(sdata, sfilter, nyquist_interval, interval_limits,
+                     rays_wrap_around, skip_between_rays, skip_along_ray,
+                     ref_folds=None, ref_valid=None, stats=None,
+                     region_budget=None):
+    """
+    Find the regions of a sweep and the number of folds in each region.
+
+    Returns the region labels, the size and unwrap number of each region,
+    the region tracker after the network reduction and the network node of
+    each region (None unless warm started).
+    """
+    # find regions in original data
+    with DealiasStats.timer(stats, 'find_regions'):
+        if interval_limits is None:
+            labels, nfeatures, interval_splits = _find_regions_within_budget(
+                sdata, sfilter, nyquist_interval, region_budget)
+        else:
+            labels, nfeatures = _find_regions(sdata, sfilter, interval_limits)
+            interval_splits = len(interval_limits) - 1
+        bincount = np.bincount(labels.ravel(), minlength=nfeatures+1)
+    num_masked_gates = bincount[0]
+    region_sizes = bincount[1:]
+
+    # find all edges between regions
+    with DealiasStats.timer(stats, 'edge_sum_and_count'):
         indices, edge_count, velos = _edge_sum_and_count(
             labels, num_masked_gates, sdata, rays_wrap_around,
-            skip_between_rays, skip_along_ray)
-
-        # find the number of folds in the regions
-        region_tracker = _RegionTracker(region_sizes)
-        edge_tracker = _EdgeTracker(indices, edge_count, velos,
-                                    nyquist_interval, nfeatures+1)
-        while True:
-            if _combine_regions(region_tracker, edge_tracker):
-                break
-
-        # center sweep if requested, determine a global sweep unfold number
-        # so that the average number of gate folds is zero.
-        if centered:
-            gates_dealiased = region_sizes.sum()
-            total_folds = np.sum(
-                region_sizes * region_tracker.unwrap_number[1:])
-            sweep_offset = int(round(float(total_folds) / gates_dealiased))
-            if sweep_offset != 0:
-                region_tracker.unwrap_number -= sweep_offset
-
-        # dealias the data using the fold numbers
-        # start from label 1 to skip masked region
-        for i in range(1, nfeatures+1):
-            nwrap = region_tracker.unwrap_number[i]
-            if nwrap != 0:
-                scorr[labels == i] += nwrap * nyquist_interval
+            skip_between_rays, skip_along_ray, stats)
+
+        # seed the regions from the reference, merging those which agree
+        node_sizes = region_sizes
+        nodes = None
+        if ref_folds is not None:
+            seed, nodes, indices, edge_count, velos = _warm_start_regions(
+                labels, nfeatures, indices, edge_count, velos, ref_folds,
+                ref_valid, nyquist_interval)
+            node_sizes = np.bincount(
+                nodes, weights=bincount)[1:].astype('int32')
+
+    # find the number of folds in the regions
+    unwrap_number, final_nodes = _unwrap_network(
+        node_sizes, indices, edge_count, velos, nyquist_interval, stats)
+    if stats is not None:
+        stats.n_regions += nfeatures
+        stats.record_bytes('labels', labels)
+        stats.record_bytes('region_edges', *indices, edge_count, *velos)
+        stats.record_params(interval_splits, skip_between_rays,
+                            skip_along_ray)
+    if nodes is not None:
+        unwrap_number = seed + unwrap_number[nodes]
+        final_nodes = final_nodes[nodes]
+    return labels, region_sizes, unwrap_number, final_nodes
+
+
+def _unwrap_network(node_sizes, indices, edge_count, velos, nyquist_interval,
+                    stats=None):
+    """
+    Reduce the network of nodes and edges, merging nodes until no edges
+    remain.
+
+    Returns the number of folds of each node and the node each node was
+    merged into, 0 for the masked node.
+    """
+    nnodes = len(node_sizes) + 1
+    if get_backend() == 'numba':
+        with DealiasStats.timer(stats, 'tracker_construction'):
+            network = _kernel('edge_network')(
+                *indices, edge_count, *velos, nyquist_interval, nnodes)
+        with DealiasStats.timer(stats, 'merge_loop'):
+            node_size = np.zeros(nnodes, dtype=np.int32)
+            node_size[1:] = node_sizes
+            unwrap_number, final_nodes, nmerges = _kernel('reduce_network')(
+                node_size, *network)
+    else:
+        with DealiasStats.timer(stats, 'tracker_construction'):
+            region_tracker = _RegionTracker(node_sizes)
+            edge_tracker = _EdgeTracker(indices, edge_count, velos,
+                                        nyquist_interval, nnodes)
+        with DealiasStats.timer(stats, 'merge_loop'):
+            nmerges = _reduce_network(region_tracker, edge_tracker)
+        unwrap_number = region_tracker.unwrap_number
+        final_nodes = _region_nodes(region_tracker)
+    if stats is not None:
+        stats.n_edges += len(indices[0]) // 2
+        stats.n_merges += nmerges
+    return unwrap_number, final_nodes
+
+
+def _sweep_memory_estimate(sfilter):
+    """ Estimate the peak number of bytes used to dealias a sweep. """
+    nrays, ngates = sfilter.shape
+    nvalid = sfilter.size - np.count_nonzero(sfilter)
+    # int64 labels and boolean mask of each interval, the int32 region
+    # labels and the float32 velocities passed to fef
+    label_bytes = nrays * ngates * (8 + 1 + 4 + 4)
+    # the edge collector holds four int32, int32, float64 and float64
+    # entries for each valid gate (and the wrapped around rays)
+    edge_bytes = 4 * (nvalid + 2 * nrays) * (4 + 4 + 8 + 8)
+    return label_bytes + edge_bytes
+
+
+def _number_of_tiles(sfilter, max_memory):
+    """ Number of azimuth sectors needed to dealias within max_memory. """
+    if max_memory is None:
+        return 1
+    n_tiles = -(-_sweep_memory_estimate(sfilter) // int(max_memory))
+    return int(min(max(n_tiles, 1), sfilter.shape[0]))
 
+
+def _dealias_sweep_folds_tiled(sdata, sfilter, n_tiles, nyquist_interval,
+                               interval_limits, rays_wrap_around,
+                               skip_between_rays, skip_along_ray, centered,
+                               ref_folds=None, ref_valid=None, stats=None,
+                               region_budget=None):
+    """
+    Dealias a sweep in azimuth sectors, return the folds of each gate.
+
+    Each sector is dealiased on its own.  The connected parts of the sectors
+    are then unfolded relative to each other by a second, much smaller,
+    network whose edges join the gates on either side of each sector
+    boundary.
+    """
+    nrays = sdata.shape[0]
+    tile_edges = np.linspace(0, nrays, n_tiles+1).astype(int)
+    tiles = list(zip(tile_edges[:-1], tile_edges[1:]))
+
+    # dealias each sector, numbering the connected parts of all sectors
+    folds = np.zeros(sdata.shape, dtype=np.int32)
+    parts = np.zeros(sdata.shape, dtype=np.int32)
+    nparts = 0
+    for start, stop in tiles:
+        tile = slice(start, stop)
+        tile_ref = (None, None)
+        if ref_folds is not None:
+            tile_ref = (ref_folds[tile], ref_valid[tile])
+        tile_budget = None
+        if region_budget is not None:
+            tile_budget = max(region_budget * (stop - start) // nrays, 1)
+        labels, _, unwrap_number, final_nodes = _dealias_regions(
+            sdata[tile], sfilter[tile], nyquist_interval, interval_limits,
+            False, skip_between_rays, skip_along_ray, *tile_ref, stats,
+            tile_budget)
+        unwrap_number[0] = 0
+        folds[tile] = unwrap_number[labels]
+
+        tile_parts = final_nodes[labels]
+        in_part = tile_parts != 0
+        part_ids, tile_parts = np.unique(tile_parts[in_part],
+                                         return_inverse=True)
+        parts[tile][in_part] = tile_parts + nparts + 1
+        nparts += len(part_ids)
+
+    # edges between the parts across each sector boundary
+    boundaries = [(tiles[i], tiles[i+1]) for i in range(n_tiles-1)]
+    if rays_wrap_around:
+        boundaries.append((tiles[-1], tiles[0]))
+    with DealiasStats.timer(stats, 'edge_sum_and_count'):
+        edges = [_boundary_edges(parts, sdata, folds, nyquist_interval,
+                                 left, right, skip_between_rays)
+                 for left, right in boundaries]
+        index1, index2, vel1, vel2 = [
+            np.concatenate(e) for e in zip(*edges)]
+        count = np.ones_like(index1, dtype=np.int32)
+        indices, count, velos = _sum_duplicate_edges(
+            index1, index2, count, vel1, vel2)
+
+    # unfold the parts relative to each other
+    part_sizes = np.bincount(parts.ravel(), minlength=nparts+1)[1:]
+    part_unwrap, _ = _unwrap_network(
+        part_sizes, indices, count, velos, nyquist_interval, stats)
+    part_unwrap[0] = 0
+    folds += part_unwrap[parts]
+
+    # center sweep if requested
+    if centered:
+        in_part = parts != 0
+        sweep_offset = int(round(
+            float(folds[in_part].sum()) / np.count_nonzero(in_part)))
+        if sweep_offset != 0:
+            folds[in_part] -= sweep_offset
+    return folds
+
+
+def _region_nodes(region_tracker):
+    """ Return the node each region was merged into, 0 for masked gates. """
+    final_nodes = np.zeros(len(region_tracker.node_size), dtype=np.int32)
+    for node, regions in enumerate(region_tracker.regions_in_node):
+        final_nodes[regions] = node
+    final_nodes[0] = 0
+    return final_nodes
+
+
+def _boundary_edges(parts, sdata, folds, nyquist_interval, left, right,
+                    max_gap):
+    """
+    Find the edges between the parts on either side of a sector boundary.
+
+    Gates are joined to the nearest gate in a part across the boundary when
+    no more than max_gap excluded gates lie between them.  Velocities are
+    those of the dealiased sectors.
+    """
+    left_rays = np.arange(max(left[0], left[1] - max_gap - 1), left[1])
+    right_rays = np.arange(right[0], min(right[1], right[0] + max_gap + 1))
+    left_parts = parts[left_rays]
+    right_parts = parts[right_rays]
+    left_valid = left_parts != 0
+    right_valid = right_parts != 0
+
+    # nearest gate in a part on each side of the boundary
+    nleft = len(left_rays)
+    left_idx = nleft - 1 - np.argmax(left_valid[::-1], axis=0)
+    right_idx = np.argmax(right_valid, axis=0)
+    gap = (nleft - 1 - left_idx) + right_idx
+    ok = left_valid.any(axis=0) & right_valid.any(axis=0) & (gap <= max_gap)
+    gates = np.nonzero(ok)[0]
+    left_ray = left_rays[left_idx[ok]]
+    right_ray = right_rays[right_idx[ok]]
+
+    part1 = parts[left_ray, gates]
+    part2 = parts[right_ray, gates]
+    vel1 = (sdata[left_ray, gates] +
+            folds[left_ray, gates] * nyquist_interval).astype(np.float64)
+    vel2 = (sdata[right_ray, gates] +
+            folds[right_ray, gates] * nyquist_interval).astype(np.float64)
+
+    # edges are stored in both directions
+    between = part1 != part2
+    part1, part2 = part1[between], part2[between]
+    vel1, vel2 = vel1[between], vel2[between]
+    return (np.concatenate((part1, part2)), np.concatenate((part2, part1)),
+            np.concatenate((vel1, vel2)), np.concatenate((vel2, vel1)))
+
+
+# state of a dealiasing worker process, set by _init_dealias_worker
+_worker_state = {}
+
+
+def _dealias_sweeps_parallel(vdata, gfilter, sweep_slices, sweep_params,
+                             n_workers, ref_folds=None, ref_valid=None,
+                             collect_stats=False):
+    """
+    Dealias sweeps across a process pool, return the folds of every gate.
+
+    The inputs and the output fold numbers live in shared memory so only the
+    ray bounds of each sweep are sent to the workers.  The statistics of
+    each sweep (None unless collect_stats is True) are returned with the
+    folds.
+    """
+    arrays = {'vdata': vdata, 'gfilter': gfilter,
+              'folds': np.zeros(vdata.shape, dtype=np.int32)}
+    if ref_folds is not None:
+        arrays['ref_folds'] = ref_folds
+        arrays['ref_valid'] = ref_valid
+    blocks = {}
+    try:
+        specs = {}
+        for name, arr in arrays.items():
+            shm = shared_memory.SharedMemory(
+                create=True, size=max(arr.nbytes, 1))
+            blocks[name] = shm
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            specs[name] = (shm.name, arr.shape, arr.dtype.str)
+
+        bounds = [(s.start, s.stop) for s in sweep_slices]
+        n_workers = min(n_workers, len(bounds))
+        with ProcessPoolExecutor(
+                n_workers, initializer=_init_dealias_worker,
+                initargs=(specs, sweep_params, collect_stats,
+                          _backend['name'])) as pool:
+            # consume the results so any worker exception is raised here
+            all_stats = list(pool.map(_dealias_shared_sweep, bounds))
+
+        folds = np.ndarray(vdata.shape, dtype=np.int32,
+                           buffer=blocks['folds'].buf).copy()
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+    return folds, all_stats
+
+
+def _init_dealias_worker(specs, sweep_params, collect_stats=False,
+                         backend='auto'):
+    """Attach the shared memory arrays in a dealiasing worker process."""
+    blocks = []
+    arrays = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker_state.update(blocks=blocks, arrays=arrays, params=sweep_params,
+                         collect_stats=collect_stats)
+    set_backend(backend)
+
+
+def _dealias_shared_sweep(bounds):
+    """
+    Dealias the sweep between the given rays of the shared arrays.
+
+    Returns the statistics of the sweep, None unless they are collected.
+    """
+    sweep_slice = slice(*bounds)
+    arrays = _worker_state['arrays']
+    sweep_ref = {}
+    if 'ref_folds' in arrays:
+        sweep_ref = dict(ref_folds=arrays['ref_folds'][sweep_slice],
+                         ref_valid=arrays['ref_valid'][sweep_slice])
+    stats = DealiasStats() if _worker_state['collect_stats'] else None
+    arrays['folds'][sweep_slice] = _dealias_sweep_folds(
+        arrays['vdata'][sweep_slice], arrays['gfilter'][sweep_slice],
+        **_worker_state['params'], **sweep_ref, stats=stats)
+    return stats
+
+
+def _as_int8_folds(folds):
+    """
+    Return a copy of a fold map as int8, raising a ValueError when a fold
+    count does not fit in it.
+    """
+    folds = np.asarray(folds)
+    if folds.size and np.abs(folds).max() > 127:
+        raise ValueError('fold count %d does not fit in an int8 fold map'
+                         % folds.flat[np.abs(folds).argmax()])
+    return folds.astype(np.int8)
+
+
+def _apply_folds(scorr, folds, nyquist_interval):
+    """Unfold the velocities of a sweep in place."""
+    folded = folds != 0
+    scorr[folded] += folds[folded] * nyquist_interval
+
+
+def _finalize_corrected(data, gfilter, original, keep_original):
+    """Mask excluded gates and optionally restore their original values."""
     # mask filtered gates
     if np.any(gfilter):
         data = np.ma.array(data, mask=gfilter)
 
     # restore original values where dealiasing not applied
     if keep_original:
-        data[gfilter] = radar.fields[vel_field]['data'][gfilter]
+        data[gfilter] = original[gfilter]
+    return data
 
-    # return field dictionary containing dealiased Doppler velocities
-    corr_vel = get_metadata(corr_vel_field)
-    corr_vel['data'] = data
-    return corr_vel
+
+def _find_regions_within_budget(vel, gfilter, nyquist_interval,
+                                region_budget):
+    """
+    Find regions of similar velocity, choosing the number of interval splits
+    from a region budget.
+
+    The number of regions of every split count between AUTO_MIN_SPLITS and
+    AUTO_MAX_SPLITS is estimated from the Euler number of the gates within
+    each interval on every other ray and gate, a vectorized pass which
+    undercounts the regions holding holes.  The regions are found with the default 3 splits and the
+    estimates scaled so that of 3 splits matches.  The most splits estimated
+    to stay within the budget are used, or the splits estimated to give the
+    fewest regions, so the regions are only found again when that is not 3.
+    Returns the labels, the number of regions and the splits.
+    """
+    nyquist_vel = nyquist_interval / 2.
+
+    def find(splits):
+        limits = _parse_interval_limits(None, splits, nyquist_vel)
+        return _find_regions(vel, gfilter, limits)
+
+    if region_budget is None:
+        return find(AUTO_MAX_SPLITS) + (AUTO_MAX_SPLITS, )
+
+    candidates = np.arange(AUTO_MIN_SPLITS, AUTO_MAX_SPLITS + 1)
+    position = (vel[::2, ::2] + nyquist_vel) / nyquist_interval
+    outside = gfilter[::2, ::2] | ~((position >= 0) & (position < 1))
+    position[outside] = 0.
+    estimates = np.array([_estimate_regions(position, outside, splits)
+                          for splits in candidates], dtype=float)
+    splits = 3
+    labels, nfeatures = find(splits)
+    estimates *= nfeatures / max(estimates[candidates == splits][0], 1.)
+
+    within = candidates[estimates <= region_budget]
+    if len(within):
+        choice = within.max()
+    else:
+        choice = candidates[np.argmin(estimates)]
+    if choice != splits:
+        splits = int(choice)
+        labels, nfeatures = find(splits)
+    return labels, nfeatures, splits
+
+
+def _estimate_regions(position, outside, splits):
+    """
+    Estimate the number of regions found with splits intervals from the
+    Euler number (regions less holes) of the gates within each interval,
+    given the position of each gate in the Nyquist interval (0 to 1).
+    """
+    interval = (position * splits).astype(np.int8)
+    interval[outside] = -1
+    inside = ~outside
+    along = inside[:, 1:] & (interval[:, 1:] == interval[:, :-1])
+    between = inside[1:] & (interval[1:] == interval[:-1])
+    squares = along[1:] & along[:-1] & between[:, 1:]
+    return (np.count_nonzero(inside) - np.count_nonzero(along) -
+            np.count_nonzero(between) + np.count_nonzero(squares))
 
 
 def _find_regions(vel, gfilter, limits):
@@ -277,7 +1453,7 @@ def _find_regions(vel, gfilter, limits):
 
         # find connected regions within the limits
         inp = (lmin <= vel) & (vel < lmax) & mask
-        limit_label, limit_nfeatures = label_image(inp)
+        limit_label, limit_nfeatures = _kernel('label_image')(inp)
 
         # add these regions to the global regions
         limit_label[np.nonzero(limit_label)] += nfeatures
@@ -288,7 +1464,7 @@ def _find_regions(vel, gfilter, limits):
 
 
 def _edge_sum_and_count(labels, num_masked_gates, data,
-                        rays_wrap_around, max_gap_x, max_gap_y):
+                        rays_wrap_around, max_gap_x, max_gap_y, stats=None):
     """
     Find all edges between labels regions.
 
@@ -298,12 +1474,22 @@ def _edge_sum_and_count(labels, num_masked_gates, data,
     if rays_wrap_around:
         total_nodes += labels.shape[0] * 2
 
-    indices, velocities = fef(
-        labels.astype('int32'), data.astype('float32'),
+    indices, velocities = _kernel('fef')(
+        labels.astype('int32', copy=False),
+        data.astype('float32', copy=False),
         rays_wrap_around, max_gap_x, max_gap_y, total_nodes)
     index1, index2 = indices
     vel1, vel2 = velocities
     count = np.ones_like(vel1, dtype=np.int32)
+    if stats is not None:
+        stats.record_bytes('edges', index1, index2, vel1, vel2, count)
+    return _sum_duplicate_edges(index1, index2, count, vel1, vel2)
+
+
+def _sum_duplicate_edges(index1, index2, count, vel1, vel2):
+    """ Combine edges between the same pair of regions. """
+    if len(index1) == 0:
+        return (index1, index2), count, (vel1, vel2)
 
     # find the unique edges, procedure based on method in
     # scipy.sparse.coo_matrix.sum_duplicates
@@ -361,6 +1547,14 @@ def _combine_regions(region_tracker, edge_tracker):
     return False
 
 
+def _reduce_network(region_tracker, edge_tracker):
+    """ Combine regions until no edges remain, return the merge count. """
+    nmerges = 0
+    while not _combine_regions(region_tracker, edge_tracker):
+        nmerges += 1
+    return nmerges
+
+
 class _RegionTracker(object):
     """
     Tracks the location of radar volume regions contained in each node
@@ -568,6 +1762,8 @@ class _EdgeTracker(object):
         #     return True, None
 
         # edge_num = self.priority_queue[0]
+        if len(self.weight) == 0:
+            return True, None
         edge_num = np.argmax(self.weight)
         node1 = self.node_alpha[edge_num]
         node2 = self.node_beta[edge_num]
@@ -619,9 +1815,11 @@ def fef(
                         if neighbor != 0:
                             break
 
-                # add the edge to the collection (if valid)
-                nvel = data[x_check, y_index]
-                collector.add_edge(label, neighbor, vel, nvel)
+                # add the edge to the collection (if valid), the search
+                # may have stopped past the edge of the sweep
+                if neighbor != 0:
+                    nvel = data[x_check, y_index]
+                    collector.add_edge(label, neighbor, vel, nvel)
 
             # right
             x_check = x_index + 1
@@ -644,9 +1842,11 @@ def fef(
                         if neighbor != 0:
                             break
 
-                # add the edge to the collection (if valid)
-                nvel = data[x_check, y_index]
-                collector.add_edge(label, neighbor, vel, nvel)
+                # add the edge to the collection (if valid), the search
+                # may have stopped past the edge of the sweep
+                if neighbor != 0:
+                    nvel = data[x_check, y_index]
+                    collector.add_edge(label, neighbor, vel, nvel)
 
             # top
             y_check = y_index - 1
@@ -664,9 +1864,11 @@ def fef(
                         if neighbor != 0:
                             break
 
-                # add the edge to the collection (if valid)
-                nvel = data[x_index, y_check]
-                collector.add_edge(label, neighbor, vel, nvel)
+                # add the edge to the collection (if valid), the search
+                # may have stopped past the edge of the sweep
+                if neighbor != 0:
+                    nvel = data[x_index, y_check]
+                    collector.add_edge(label, neighbor, vel, nvel)
 
             # bottom
             y_check = y_index + 1
@@ -684,9 +1886,11 @@ def fef(
                         if neighbor != 0:
                             break
 
-                # add the edge to the collection (if valid)
-                nvel = data[x_index, y_check]
-                collector.add_edge(label, neighbor, vel, nvel)
+                # add the edge to the collection (if valid), the search
+                # may have stopped past the edge of the sweep
+                if neighbor != 0:
+                    nvel = data[x_index, y_check]
+                    collector.add_edge(label, neighbor, vel, nvel)
 
     indices, velocities = collector.get_indices_and_velocities()
     return indices, velocities
@@ -727,4 +1931,254 @@ class _EdgeCollector:
         """ Return the edge indices and velocities. """
         indices = (self.l_index[:self.idx], self.n_index[:self.idx])
         velocities = (self.l_velo[:self.idx], self.n_velo[:self.idx])
-        return indices, velocities
\ No newline at end of file
+        return indices, velocities
+
+
+# Loops compiled by numba for the 'numba' backend.  The labeling and edge
+# finding loops are plain Python and can also be run, slowly, without it.
+
+def _label_image_loop(arr):
+    """
+    Label the 4-connected regions of a boolean array.
+
+    Regions are numbered in the order their first gate is found scanning the
+    array row by row, giving the same labels as label_image.
+    """
+    nrows, ncols = arr.shape
+    labels = np.zeros((nrows, ncols), dtype=np.int64)
+    stack = np.empty(nrows * ncols, dtype=np.int64)
+    label_count = 0
+    for i in range(nrows):
+        for j in range(ncols):
+            if not arr[i, j] or labels[i, j] != 0:
+                continue
+            # flood fill the region starting from this gate
+            label_count += 1
+            labels[i, j] = label_count
+            stack[0] = i * ncols + j
+            nstack = 1
+            while nstack > 0:
+                nstack -= 1
+                row = stack[nstack] // ncols
+                col = stack[nstack] % ncols
+                for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                    x, y = row + dx, col + dy
+                    if (0 <= x < nrows and 0 <= y < ncols and arr[x, y] and
+                            labels[x, y] == 0):
+                        labels[x, y] = label_count
+                        stack[nstack] = x * ncols + y
+                        nstack += 1
+    return labels, label_count
+
+
+def _fef_compiled(labels, data, rays_wrap_around, max_gap_x, max_gap_y,
+                  total_nodes):
+    """ Same as fef using the compiled edge finding loop. """
+    l_index = np.zeros(total_nodes * 4, dtype=np.int32)
+    n_index = np.zeros(total_nodes * 4, dtype=np.int32)
+    l_velo = np.zeros(total_nodes * 4, dtype=np.float64)
+    n_velo = np.zeros(total_nodes * 4, dtype=np.float64)
+    nedges = _compiled['fef'](
+        labels, data, rays_wrap_around, max_gap_x, max_gap_y,
+        l_index, n_index, l_velo, n_velo)
+    indices = (l_index[:nedges], n_index[:nedges])
+    velocities = (l_velo[:nedges], n_velo[:nedges])
+    return indices, velocities
+
+
+def _fef_loop(labels, data, rays_wrap_around, max_gap_x, max_gap_y,
+              l_index, n_index, l_velo, n_velo):
+    """
+    Find the edges between regions, storing them in the given arrays.
+
+    Follows fef gate by gate, returns the number of edges found.
+    """
+    nrays, ngates = labels.shape
+    nedges = 0
+    for x_index in range(nrays):
+        for y_index in range(ngates):
+
+            label = labels[x_index, y_index]
+            if label == 0:
+                continue
+            vel = data[x_index, y_index]
+
+            # left and right, looking over up to max_gap_x masked gates
+            for step in (-1, 1):
+                x_check = x_index + step
+                neighbor = 0
+                for i in range(max_gap_x + 1):
+                    if x_check == -1 or x_check == nrays:
+                        if not rays_wrap_around:
+                            break
+                        x_check = nrays - 1 if x_check == -1 else 0
+                    neighbor = labels[x_check, y_index]
+                    if neighbor != 0:
+                        break
+                    x_check += step
+                if neighbor != 0 and neighbor != label:
+                    l_index[nedges] = label
+                    n_index[nedges] = neighbor
+                    l_velo[nedges] = vel
+                    n_velo[nedges] = data[x_check, y_index]
+                    nedges += 1
+
+            # top and bottom, looking over up to max_gap_y masked gates
+            for step in (-1, 1):
+                y_check = y_index + step
+                neighbor = 0
+                for i in range(max_gap_y + 1):
+                    if y_check == -1 or y_check == ngates:
+                        break
+                    neighbor = labels[x_index, y_check]
+                    if neighbor != 0:
+                        break
+                    y_check += step
+                if neighbor != 0 and neighbor != label:
+                    l_index[nedges] = label
+                    n_index[nedges] = neighbor
+                    l_velo[nedges] = vel
+                    n_velo[nedges] = data[x_index, y_check]
+                    nedges += 1
+    return nedges
+
+
+def _edge_network_loop(index1, index2, edge_count, vel1, vel2,
+                       nyquist_interval, nnodes):
+    """
+    Build the edges of the network as _EdgeTracker does.
+
+    Returns the nodes, the summed difference and weight of each edge and the
+    list of edges of each node.
+    """
+    nedges = len(index1) // 2
+    node_alpha = np.zeros(nedges, dtype=np.int32)
+    node_beta = np.zeros(nedges, dtype=np.int32)
+    sum_diff = np.zeros(nedges, dtype=np.float32)
+    weight = np.zeros(nedges, dtype=np.int32)
+    edges_in_node = numba.typed.List()
+    for i in range(nnodes):
+        edges_in_node.append(numba.typed.List.empty_list(numba.int64))
+
+    edge = 0
+    for k in range(len(index1)):
+        i = index1[k]
+        j = index2[k]
+        if i < j:
+            continue
+        node_alpha[edge] = i
+        node_beta[edge] = j
+        sum_diff[edge] = (vel1[k] - vel2[k]) / nyquist_interval
+        weight[edge] = edge_count[k]
+        edges_in_node[i].append(edge)
+        edges_in_node[j].append(edge)
+        edge += 1
+    return node_alpha, node_beta, sum_diff, weight, edges_in_node
+
+
+def _reduce_network_loop(node_size, node_alpha, node_beta, sum_diff, weight,
+                         edges_in_node):
+    """
+    Merge nodes until no edges remain, as _reduce_network does with the
+    _RegionTracker and _EdgeTracker.
+
+    Returns the number of folds of each node, the node each node was merged
+    into and the number of merges.
+    """
+    nnodes = len(node_size)
+    unwrap_number = np.zeros(nnodes, dtype=np.int32)
+    regions_in_node = numba.typed.List()
+    for i in range(nnodes):
+        regions = numba.typed.List.empty_list(numba.int64)
+        regions.append(i)
+        regions_in_node.append(regions)
+    common_finder = np.zeros(nnodes, dtype=np.bool_)
+    common_index = np.zeros(nnodes, dtype=np.int32)
+    last_base_node = -1
+
+    nmerges = 0
+    while len(weight) > 0:
+        # edge with the largest weight
+        edge_num = np.argmax(weight)
+        node1 = node_alpha[edge_num]
+        node2 = node_beta[edge_num]
+        if weight[edge_num] < 0:
+            break
+        diff = sum_diff[edge_num] / np.float32(weight[edge_num])
+        rdiff = int(np.rint(diff))
+
+        # determine which nodes should be merged
+        if node_size[node1] > node_size[node2]:
+            base_node, merge_node = node1, node2
+        else:
+            base_node, merge_node = node2, node1
+            rdiff = -rdiff
+
+        # unwrap merge_node
+        if rdiff != 0:
+            for region in regions_in_node[merge_node]:
+                unwrap_number[region] += rdiff
+            for edge in edges_in_node[merge_node]:
+                if merge_node == node_alpha[edge]:
+                    sum_diff[edge] += weight[edge] * rdiff
+                else:
+                    sum_diff[edge] += -weight[edge] * rdiff
+
+        # merge the regions of the nodes
+        regions_in_node[base_node].extend(regions_in_node[merge_node])
+        regions_in_node[merge_node] = numba.typed.List.empty_list(
+            numba.int64)
+        node_size[base_node] += node_size[merge_node]
+        node_size[merge_node] = 0
+
+        # remove edge between base and merge nodes
+        weight[edge_num] = -999
+        edges_in_node[merge_node].remove(edge_num)
+        edges_in_node[base_node].remove(edge_num)
+        common_finder[merge_node] = False
+        edges_in_merge = edges_in_node[merge_node].copy()
+
+        # find all neighboring nodes to base_node, reversing edges as
+        # needed so node_alpha is base_node
+        if last_base_node != base_node:
+            common_finder[:] = False
+            for edge in edges_in_node[base_node]:
+                if node_beta[edge] == base_node:
+                    node_beta[edge] = node_alpha[edge]
+                    node_alpha[edge] = base_node
+                    sum_diff[edge] = -sum_diff[edge]
+                neighbor = node_beta[edge]
+                common_finder[neighbor] = True
+                common_index[neighbor] = edge
+
+        # point the merge_node edges to the base node, combining those to
+        # nodes base_node also has an edge with
+        for edge in edges_in_merge:
+            if node_beta[edge] == merge_node:
+                node_beta[edge] = node_alpha[edge]
+                node_alpha[edge] = merge_node
+                sum_diff[edge] = -sum_diff[edge]
+            node_alpha[edge] = base_node
+            neighbor = node_beta[edge]
+            if common_finder[neighbor]:
+                base_edge = common_index[neighbor]
+                weight[base_edge] += weight[edge]
+                weight[edge] = -999
+                sum_diff[base_edge] += sum_diff[edge]
+                edges_in_node[merge_node].remove(edge)
+                edges_in_node[neighbor].remove(edge)
+            else:
+                common_finder[neighbor] = True
+                common_index[neighbor] = edge
+
+        # move all edges from merge_node to base_node
+        edges_in_node[base_node].extend(edges_in_node[merge_node])
+        edges_in_node[merge_node] = numba.typed.List.empty_list(numba.int64)
+        last_base_node = base_node
+        nmerges += 1
+
+    final_nodes = np.zeros(nnodes, dtype=np.int32)
+    for node in range(1, nnodes):
+        for region in regions_in_node[node]:
+            final_nodes[region] = node
+    return unwrap_number, final_nodes, nmerges
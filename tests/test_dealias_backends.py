@@ -0,0 +1,65 @@
+"""Check that the numba and pure Python dealiasing backends agree."""
+import os
+import sys
+import warnings
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'radar', 'libnexrad', 'level2'))
+sys.path.insert(
+    0, os.path.join(ROOT, 'app', 'radar', 'libnexrad_helpers', 'level2', 'dealias'))
+
+from level2_parser import NEXRADLevel2File  # noqa: E402
+import region_based_dealias  # noqa: E402
+
+pytest.importorskip('numba')
+
+
+@pytest.fixture(scope='module')
+def nfile():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return NEXRADLevel2File(os.path.join(ROOT, 'data', 'KTLX19990503_235621.gz'))
+
+
+@pytest.fixture
+def backend():
+    yield region_based_dealias.set_backend
+    region_based_dealias.set_backend('auto')
+
+
+def fold_maps(nfile, scan, set_backend, **kwargs):
+    """Fold maps of a scan dealiased with the python and numba backends."""
+    folds = []
+    for name in ('python', 'numba'):
+        set_backend(name)
+        assert region_based_dealias.get_backend() == name
+        corr = region_based_dealias.dealias_level2_sweep(
+            nfile, scan, fold_map=True, **kwargs)
+        folds.append(corr.folds)
+    return folds
+
+
+@pytest.mark.parametrize('scan', [10, 14])
+def test_backends_identical_fold_maps(nfile, backend, scan):
+    python_folds, numba_folds = fold_maps(nfile, scan, backend)
+    assert np.count_nonzero(python_folds)
+    np.testing.assert_array_equal(python_folds, numba_folds)
+
+
+def test_backends_identical_fold_maps_tiled(nfile, backend):
+    python_folds, numba_folds = fold_maps(
+        nfile, 14, backend, max_memory=1e6, interval_splits='auto')
+    np.testing.assert_array_equal(python_folds, numba_folds)
+
+
+def test_kernels_identical_labels(backend):
+    arr = np.random.default_rng(0).random((60, 80)) < 0.55
+    backend('python')
+    python_labels = region_based_dealias._kernel('label_image')(arr)
+    backend('numba')
+    numba_labels = region_based_dealias._kernel('label_image')(arr)
+    np.testing.assert_array_equal(python_labels[0], numba_labels[0])
+    assert python_labels[1] == numba_labels[1]
@@ -0,0 +1,181 @@
+"""Check the array decoding of Level III symbol and vector packets."""
+import glob
+import math
+import os
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'radar', 'libnexrad', 'level3'))
+
+from level3_parser import IOBuffer, NEXRADLevel3File, stack_vectors  # noqa: E402
+
+DATA = os.path.join(ROOT, 'tests', 'data', 'level3_packets')
+PACKETS = sorted(fn for fn in glob.glob(os.path.join(DATA, '*.bin'))
+                 if not os.path.basename(fn).startswith(('vector', 'contour')))
+
+TYPES = {3: 'Mesocyclone', 11: '3D Correlated Shear', 12: 'TVS', 26: 'ETVS',
+         13: 'Positive Hail', 14: 'Probable Hail', 15: 'Storm ID', 19: 'HDA',
+         25: 'STI Circle'}
+POINT_FEATURES = {1: 'Mesocyclone (ext.)', 3: 'Mesocyclone', 5: 'TVS (Ext.)',
+                  6: 'ETVS (Ext.)', 7: 'TVS', 8: 'ETVS', 9: 'MDA', 10: 'MDA (Elev.)',
+                  11: 'MDA (Weak)'}
+TRENDS = ['Cell Top', 'Cell Base', 'Max Reflectivity Height', 'Probability of Hail',
+          'Probability of Severe Hail', 'Cell-based VIL', 'Maximum Reflectivity',
+          'Centroid Height']
+TREND_SCALES = [100, 100, 100, 1, 1, 1, 1, 100]
+
+
+def read_trends(data, pos):
+    """Read one circular buffer of trend values, latest last."""
+    num_vols, latest = data[pos], data[pos + 1]
+    vals = list(struct.unpack_from(f'>{num_vols}h', data, pos + 2))
+    return vals[latest:] + vals[:latest], pos + 2 + 2 * num_vols
+
+
+def decode_records(code, data, scale):
+    """Decode a packet one record at a time into lists, as the parser used to."""
+    num_bytes = struct.unpack_from('>H', data, 2)[0]
+    pos, end = 4, 4 + num_bytes
+    ret = {}
+    if code == 22:
+        return {'times': read_trends(data, pos)[0]}
+    if code == 21:
+        cell_id, x, y = struct.unpack_from('>2shh', data, pos)
+        ret = {'id': cell_id.decode('ascii'), 'x': x * scale, 'y': y * scale}
+        pos += 6
+        while pos < end:
+            trend = struct.unpack_from('>h', data, pos)[0]
+            vals, pos = read_trends(data, pos + 2)
+            if trend in (1, 2):
+                ret[f'{TRENDS[trend - 1]} Limited'] = [v > 700 for v in vals]
+                vals = [v - 1000 if v > 700 else v for v in vals]
+            ret[TRENDS[trend - 1]] = [v * TREND_SCALES[trend - 1] for v in vals]
+        return ret
+
+    while pos < end:
+        if code == 4:
+            color, x, y, direc, speed = struct.unpack_from('>5h', data, pos)
+            pos += 10
+            ret.setdefault('color', []).append(color)
+            ret.setdefault('direc', []).append(direc)
+            ret.setdefault('speed', []).append(speed)
+        else:
+            x, y = struct.unpack_from('>hh', data, pos)
+            pos += 4
+        ret.setdefault('x', []).append(x * scale)
+        ret.setdefault('y', []).append(y * scale)
+        if code in (3, 11, 25):
+            ret.setdefault('radius', []).append(struct.unpack_from('>h', data, pos)[0] * scale)
+            pos += 2
+        elif code == 15:
+            ret.setdefault('id', []).append(data[pos:pos + 2].decode('ascii'))
+            pos += 2
+        elif code == 19:
+            poh, posh, max_size = struct.unpack_from('>hhH', data, pos)
+            pos += 6
+            ret.setdefault('POH', []).append(poh)
+            ret.setdefault('POSH', []).append(posh)
+            ret.setdefault('Max Size', []).append(max_size)
+        elif code == 20:
+            kind, attr = struct.unpack_from('>HH', data, pos)
+            pos += 4
+            if kind < 5 or kind > 8:
+                ret.setdefault('radius', []).append(attr * scale)
+            ret.setdefault('type', []).append(POINT_FEATURES.get(kind, f'Unknown ({kind:d})'))
+    if code in TYPES:
+        ret['type'] = TYPES[code]
+
+    # Single item lists were reduced to the item
+    return {key: val[0] if isinstance(val, list) and len(val) == 1 else val
+            for key, val in ret.items()}
+
+
+def as_records(code, decoded):
+    """Convert the arrays returned by the parser to the per-record layout."""
+    ret = {}
+    for key, val in decoded.items():
+        if isinstance(val, np.ndarray):
+            val = val.tolist()
+            if code == 20 and key == 'radius':
+                val = [v for v in val if not math.isnan(v)]
+            if code not in (21, 22) and len(val) == 1:
+                val = val[0]
+        ret[key] = val
+    return ret
+
+
+def read_packets(filename, in_sym_block):
+    """Decode the packets of a fixture file as (code, packet) pairs."""
+    with open(os.path.join(DATA, filename), 'rb') as fobj:
+        data = fobj.read()
+    parser = NEXRADLevel3File.__new__(NEXRADLevel3File)
+    parser.filename = filename
+    parser._buffer = IOBuffer(data)
+    packets = []
+    while not parser._buffer.at_end():
+        code = parser._buffer.read_int(2, 'big', signed=False)
+        packets.append((code, parser.packet_map[code](parser, code, in_sym_block)))
+    return packets
+
+
+@pytest.mark.parametrize('in_sym_block', [True, False])
+@pytest.mark.parametrize('filename', PACKETS, ids=os.path.basename)
+def test_packet_matches_records(filename, in_sym_block):
+    with open(filename, 'rb') as fobj:
+        data = fobj.read()
+    [(code, decoded)] = read_packets(filename, in_sym_block)
+    assert as_records(code, decoded) == decode_records(code, data,
+                                                       0.25 if in_sym_block else 1)
+
+
+def test_packet_dtypes():
+    [(_, decoded)] = read_packets('symbol_point_feature.bin', True)
+    assert decoded['x'].dtype == np.float32
+    assert decoded['radius'].dtype == np.float32
+    assert np.isnan(decoded['radius']).sum() == 3
+    assert decoded['type'][-1] == 'MDA (Weak)'
+
+    [(_, decoded)] = read_packets('wind_barbs.bin', True)
+    assert decoded['speed'].dtype == np.int16
+    assert decoded['y'].dtype == np.float32
+
+
+LINKED = [[1, 2], [3, -4], [-5, 6]]
+SEGMENTS = [[-25, 10, 9, 0], [0.5, -0.5, 100, 0.25]]
+CONTOUR = [[7, -8], [0.25, 0.5], [0.75, 1]]
+
+
+@pytest.mark.parametrize('filename, code, vectors, color', [
+    ('vector_linked.bin', 6, LINKED, None),
+    ('vector_linked_value.bin', 9, LINKED, 5),
+    ('vector_unlinked.bin', 7, SEGMENTS, None),
+    ('vector_unlinked_value.bin', 10, SEGMENTS, 3),
+    ('contour_linked.bin', 0x0E03, CONTOUR, None),
+])
+@pytest.mark.parametrize('in_sym_block', [True, False])
+def test_vector_packets(filename, code, vectors, color, in_sym_block):
+    [(packet_code, decoded)] = read_packets(filename, in_sym_block)
+    assert packet_code == code
+    assert decoded['vectors'].dtype == np.float32
+    expected = np.array(vectors, dtype=np.float32) * (1 if in_sym_block else 4)
+    np.testing.assert_array_equal(decoded['vectors'], expected)
+    assert decoded.get('color') == color
+
+
+def test_stack_vectors():
+    vectors, colors, offsets = stack_vectors(
+        packet for _, packet in read_packets('contour_layer.bin', True))
+    assert vectors.dtype == np.float32
+    np.testing.assert_array_equal(vectors, CONTOUR + CONTOUR + LINKED + LINKED)
+    assert colors.dtype == np.int16
+    assert colors.tolist() == [4, 4, -1, 5]
+    assert offsets.tolist() == [0, 3, 6, 9, 12]
+
+    vectors, colors, offsets = stack_vectors([])
+    assert vectors.shape == (0, 2)
+    assert colors.shape == (0,)
+    assert offsets.tolist() == [0]
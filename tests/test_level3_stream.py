@@ -0,0 +1,54 @@
+"""Check that the Level III stream splitter returns the concatenated products unchanged."""
+import glob
+import io
+import os
+import sys
+import zlib
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'radar', 'libnexrad', 'level3'))
+
+from level3_parser import (Level3StreamSplitter, iter_level3_products,  # noqa: E402
+                           wmo_finder)
+
+SAMPLES = sorted(glob.glob(os.path.join(ROOT, 'data', 'level3', '*')))
+
+
+def zlib_framed(raw, frame_size=5000):
+    """Repackage a product as the zlib frames of a compressed product."""
+    header_end = wmo_finder.search(str(raw[:64], 'ascii', 'ignore')).end()
+    frames = b''.join(zlib.compress(raw[i:i + frame_size])
+                      for i in range(0, len(raw), frame_size))
+    return raw[:header_end] + frames + b'\r\r\n\x03'
+
+
+@pytest.fixture(scope='module')
+def products():
+    products = [open(fn, 'rb').read() for fn in SAMPLES]
+    products.append(zlib_framed(products[0]))
+    products.append(b'NOUS63 KOUN 202016\r\r\nFTMTLX\r\r\nSome free text\r\r\n\x03')
+    return products
+
+
+@pytest.fixture(scope='module')
+def stream(products):
+    return b''.join(b'\x01\r\r\n%03d \r\r\n' % i + p for i, p in enumerate(products))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 13, 4096, 65536])
+def test_splitter_chunk_sizes(products, stream, chunk_size):
+    splitter = Level3StreamSplitter()
+    split = []
+    for i in range(0, len(stream), chunk_size):
+        split.extend(bytes(p) for p in splitter.feed(stream[i:i + chunk_size]))
+    split.extend(bytes(p) for p in splitter.close())
+    assert len(split) == len(products)
+    for got, expected in zip(split, products):
+        assert got == expected
+
+
+def test_iter_level3_products(products, stream):
+    split = [bytes(p) for p in iter_level3_products(io.BytesIO(stream), chunk_size=1000)]
+    assert split == products
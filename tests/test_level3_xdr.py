@@ -0,0 +1,105 @@
+"""Check the decoding of the XDR radial components of generic Level III products."""
+import os
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'radar', 'libnexrad', 'level3'))
+
+from level3_parser import Level3XDRParser  # noqa: E402
+
+
+def xdr_string(value):
+    """Encode a string as XDR: length, then the bytes padded to 4."""
+    value = value.encode('ascii')
+    return struct.pack('>L', len(value)) + value + b'\0' * (-len(value) % 4)
+
+
+def radial_component(radials):
+    """Encode a radial component from (azimuth, attributes, gates) tuples."""
+    out = [xdr_string('Radial'), struct.pack('>ff', 250., 2125.),
+           struct.pack('>ll', 0, 0), struct.pack('>l', len(radials))]
+    for i, (azimuth, attributes, gates) in enumerate(radials):
+        out.append(struct.pack('>fffl', azimuth, 0.5, 1.0, 100 + i))
+        out.append(xdr_string(attributes))
+        out.append(struct.pack(f'>L{len(gates)}l', len(gates), *gates))
+    return b''.join(out)
+
+
+def make_radials(num_rads, num_gates, attributes):
+    rng = np.random.default_rng(num_rads)
+    return [(0.5 * i, attributes(i), rng.integers(-5, 300, num_gates(i)).tolist())
+            for i in range(num_rads)]
+
+
+def check_radial(comp, radials):
+    assert comp.description == 'Radial'
+    assert comp.gate_width == 250.
+    assert comp.first_gate == 2125.
+    assert comp.parameters is None
+    assert comp.azimuth.dtype == np.float32
+    np.testing.assert_array_equal(comp.azimuth, [r[0] for r in radials])
+    np.testing.assert_array_equal(comp.elevation, np.full(len(radials), 0.5))
+    np.testing.assert_array_equal(comp.width, np.ones(len(radials)))
+    assert comp.num_bins.dtype == np.int32
+    np.testing.assert_array_equal(comp.num_bins, 100 + np.arange(len(radials)))
+    assert comp.attributes.tolist() == [r[1] for r in radials]
+    assert comp.data.dtype == np.int32
+    assert comp.data.shape == (len(radials), max(len(r[2]) for r in radials))
+    for row, (_, _, gates) in zip(comp.data, radials):
+        assert row[:len(gates)].tolist() == gates
+        assert not row[len(gates):].any()
+
+
+@pytest.mark.parametrize('num_gates, attributes', [
+    (lambda i: 460, lambda i: ''),
+    (lambda i: 100, lambda i: 'ab'),
+    (lambda i: 100, lambda i: 'attr'),
+])
+def test_uniform_radials(num_gates, attributes):
+    radials = make_radials(360, num_gates, attributes)
+    data = radial_component(radials)
+    parser = Level3XDRParser(data)
+    check_radial(parser._unpack_radial(), radials)
+    assert parser.get_position() == len(data)
+
+    # The bulk decoding matches the per-radial one
+    header = len(data) - sum(20 + len(xdr_string(r[1])) + 4 * len(r[2]) for r in radials)
+    bulk = Level3XDRParser(data)
+    bulk.set_position(header)
+    fallback = Level3XDRParser(data)
+    fallback.set_position(header)
+    records = bulk._unpack_radial_records(360)
+    assert records is not None
+    for a, b in zip(records, fallback._unpack_radial_list(360)):
+        assert a.dtype == b.dtype
+        np.testing.assert_array_equal(a, b)
+    assert bulk.get_position() == fallback.get_position() == len(data)
+
+
+@pytest.mark.parametrize('num_gates, attributes', [
+    (lambda i: 10 + i % 7, lambda i: ''),
+    (lambda i: 5, lambda i: 'x' * (i % 3)),
+])
+def test_ragged_radials(num_gates, attributes):
+    radials = make_radials(50, num_gates, attributes)
+    data = radial_component(radials)
+    parser = Level3XDRParser(data)
+    check_radial(parser._unpack_radial(), radials)
+    assert parser.get_position() == len(data)
+
+    # Only the per-radial decoding handles these
+    header = len(data) - sum(20 + len(xdr_string(r[1])) + 4 * len(r[2]) for r in radials)
+    parser.set_position(header)
+    assert parser._unpack_radial_records(50) is None
+    assert parser.get_position() == header
+
+
+@pytest.mark.parametrize('num_gates', [lambda i: 20, lambda i: 20 - i])
+def test_truncated_radials(num_gates):
+    data = radial_component(make_radials(10, num_gates, lambda i: ''))[:-8]
+    with pytest.raises(EOFError):
+        Level3XDRParser(data)._unpack_radial()
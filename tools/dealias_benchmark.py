@@ -0,0 +1,251 @@
+"""
+Correctness and speed benchmark for the region based dealiasing.
+
+Dealiases every velocity sweep of the bundled radar volumes and reports,
+for each sweep, the wall time, the peak memory traced by tracemalloc and
+the number of regions, edges and merges of the network reduction.  The
+fold map of each sweep (the number of Nyquist intervals added to every
+gate) is compared bit for bit against a stored reference so optimisations
+of the labeler or the edge tracker can show they remain exactly
+equivalent to the Py-ART algorithm while getting faster.
+
+Usage::
+
+    python tools/dealias_benchmark.py                     # bundled volumes
+    python tools/dealias_benchmark.py --repeat 3 FILE ... # best of 3 runs
+    python tools/dealias_benchmark.py --update-reference  # store fold maps
+    python tools/dealias_benchmark.py --compare-backends  # numba vs python
+
+Level 2 files are read with NEXRADLevel2File.  Other formats (for example
+the Sigmet volume data/MZZU_20230210_2222) are read with Py-ART when it is
+installed and skipped otherwise.  --backend selects the kernel backend
+being timed, --compare-backends also dealiases every sweep with the pure
+Python backend and checks that the fold maps are identical.  The exit status
+is 1 when any fold map differs from the reference or between backends.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'radar', 'libnexrad', 'level2'))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'radar', 'libnexrad_helpers',
+                                'level2', 'dealias'))
+
+from level2_parser import NEXRADLevel2File  # noqa: E402
+import region_based_dealias  # noqa: E402
+
+DEFAULT_FILES = [
+    os.path.join(ROOT, 'data', 'KTLX19990503_235621.gz'),
+    os.path.join(ROOT, 'data', 'KBLX20090603_004417_V03.gz'),
+    os.path.join(ROOT, 'data', 'KMLB19920824_134828.gz'),
+    os.path.join(ROOT, 'data', 'MZZU_20230210_2222'),
+]
+DEFAULT_REFERENCE = os.path.join(ROOT, 'tools', 'dealias_reference.npz')
+
+
+def level2_sweeps(filename):
+    """
+    Yield (scan, velocity, nyquist, dealias) for each velocity sweep of a
+    level 2 file, dealias(**kwargs) returns the corrected velocities.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        nfile = NEXRADLevel2File(filename)
+    for scan in range(nfile.nscans):
+        msg = nfile.radial_records[nfile.scan_msgs[scan][0]]
+        if 'VEL' not in msg or msg['VEL']['ngates'] == 0:
+            continue
+        velocity = nfile.get_data('VEL', msg['VEL']['ngates'], scans=[scan])
+        nyquist = float(nfile.get_nyquist_vel([scan])[0])
+
+        def dealias(scan=scan, **kwargs):
+            return region_based_dealias.dealias_level2_sweep(
+                nfile, scan, **kwargs)
+
+        yield scan, velocity, nyquist, dealias
+
+
+def pyart_sweeps(filename):
+    """
+    Yield (sweep, velocity, nyquist, dealias) for each sweep of a volume
+    read by Py-ART, dealias(**kwargs) returns the corrected velocities.
+    """
+    import pyart
+
+    radar = pyart.io.read(filename)
+    vel_field = pyart.config.get_field_name('velocity')
+    if vel_field not in radar.fields:
+        return
+    for sweep in range(radar.nsweeps):
+        sweep_radar = radar.extract_sweeps([sweep])
+        velocity = sweep_radar.fields[vel_field]['data']
+        nyquist = float(radar.get_nyquist_vel(sweep))
+
+        def dealias(sweep_radar=sweep_radar, **kwargs):
+            corr_vel = region_based_dealias.dealias_region_based(
+                sweep_radar, **kwargs)
+            return corr_vel['data']
+
+        yield sweep, velocity, nyquist, dealias
+
+
+def read_sweeps(filename):
+    """Return the sweeps of a file, None if it cannot be read."""
+    try:
+        return list(level2_sweeps(filename))
+    except (ValueError, IndexError, OSError):
+        pass
+    try:
+        return list(pyart_sweeps(filename))
+    except ImportError:
+        return None
+
+
+def fold_map(velocity, corrected, nyquist):
+    """Number of Nyquist intervals added to each gate, as int8."""
+    diff = np.ma.getdata(corrected) - np.ma.getdata(velocity)
+    folds = np.rint(diff / (2.0 * nyquist))
+    folds[~np.isfinite(folds)] = 0
+    return folds.astype(np.int8)
+
+
+def benchmark_sweep(dealias, repeat, trace_memory):
+    """
+    Dealias a sweep, return the corrected velocities, the best wall time,
+    the peak traced memory in bytes (None if not traced) and the stats.
+    """
+    best = None
+    for _ in range(repeat):
+        stats = []
+        start = time.perf_counter()
+        corrected = dealias(stats_hook=stats.append)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            dealias()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return corrected, best, peak, stats[0]
+
+
+def warm_up():
+    """Compile the kernels of the backend outside of the timed runs."""
+    velocity = np.linspace(-20.0, 20.0, 64, dtype=np.float32).reshape(8, 8)
+    region_based_dealias.dealias_sweep(velocity, 10.0)
+
+
+def backend_parity(dealias, backend, velocity, nyquist, folds):
+    """
+    Dealias a sweep with the pure Python backend, return True when its fold
+    map is identical to folds.
+    """
+    region_based_dealias.set_backend('python')
+    try:
+        python_folds = fold_map(velocity, dealias(), nyquist)
+    finally:
+        region_based_dealias.set_backend(backend)
+    return np.array_equal(python_folds, folds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='*', default=DEFAULT_FILES)
+    parser.add_argument('--reference', default=DEFAULT_REFERENCE,
+                        help='npz file holding the reference fold maps')
+    parser.add_argument('--update-reference', action='store_true',
+                        help='store the fold maps as the new reference')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='report the best wall time of this many runs')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the (slower) tracemalloc run')
+    parser.add_argument('--backend', default='auto',
+                        choices=['auto', 'numba', 'python'],
+                        help='kernel backend to benchmark')
+    parser.add_argument('--compare-backends', action='store_true',
+                        help='check the fold maps against the pure Python '
+                        'backend')
+    args = parser.parse_args(argv)
+
+    region_based_dealias.set_backend(args.backend)
+    print('backend: %s' % region_based_dealias.get_backend())
+    warm_up()
+
+    reference = {}
+    if os.path.exists(args.reference):
+        with np.load(args.reference) as npz:
+            reference = dict(npz)
+
+    header = '%-28s %5s %11s %8s %8s %7s %7s %7s  %s' % (
+        'file', 'sweep', 'shape', 'time s', 'peak MB', 'regions', 'edges',
+        'merges', 'fold map')
+    print(header)
+    print('-' * len(header))
+    new_reference = {}
+    mismatches = 0
+    total_time = 0.0
+    for filename in args.files:
+        name = os.path.basename(filename)
+        sweeps = read_sweeps(filename)
+        if not sweeps:
+            print('%-28s skipped, no readable velocity sweeps' % name)
+            continue
+        for sweep, velocity, nyquist, dealias in sweeps:
+            corrected, elapsed, peak, stats = benchmark_sweep(
+                dealias, args.repeat, not args.no_memory)
+            total_time += elapsed
+
+            key = '%s/%d' % (name, sweep)
+            folds = fold_map(velocity, corrected, nyquist)
+            new_reference[key] = folds
+            if key not in reference:
+                status = 'no reference'
+            elif np.array_equal(reference[key], folds):
+                status = 'identical'
+            else:
+                if reference[key].shape == folds.shape:
+                    ndiff = np.count_nonzero(reference[key] != folds)
+                else:
+                    ndiff = folds.size
+                status = 'DIFFERS at %d gates' % ndiff
+                mismatches += 1
+            if (args.compare_backends and
+                    region_based_dealias.get_backend() != 'python'):
+                if backend_parity(dealias, args.backend, velocity, nyquist,
+                                  folds):
+                    status += ', backends identical'
+                else:
+                    status += ', BACKENDS DIFFER'
+                    mismatches += 1
+
+            peak_mb = '-' if peak is None else '%.1f' % (peak / 1e6)
+            print('%-28s %5d %11s %8.3f %8s %7d %7d %7d  %s' % (
+                name, sweep, '%dx%d' % folds.shape, elapsed, peak_mb,
+                stats.n_regions, stats.n_edges, stats.n_merges, status))
+
+    print('-' * len(header))
+    print('total dealiasing time %.3f s, %d fold map(s) differ' % (
+        total_time, mismatches))
+
+    if args.update_reference:
+        reference.update(new_reference)
+        np.savez_compressed(args.reference, **reference)
+        print('reference fold maps written to %s' % args.reference)
+        return 0
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""
+Index the headers of large Level III product archives into SQLite.
+
+Every product is opened but only its head is read: the WMO header plus the
+first bytes of the message, inflated from the zlib framing when there is one,
+which is enough for the message header and the product description block.
+The symbology, graphic and tabular blocks are never decompressed.  The site,
+AWIPS identifier, product code, elevation, volume and product times and the
+byte offsets of the product blocks are written to a ``products`` table,
+indexed for 'latest product of a kind for a site at a time' queries.
+
+Usage::
+
+    python tools/level3_catalog.py --db level3.sqlite ARCHIVE_DIR ...
+    python tools/level3_catalog.py --db level3.sqlite --latest N0QTLX
+    python tools/level3_catalog.py --db level3.sqlite --latest N0QTLX \\
+        --at 2013-05-20T20:16
+
+Headers are read across a process pool (--workers).  Files already in the
+catalog with the same size and modification time are skipped, so an archive
+can be re-indexed incrementally.  Times are stored as milliseconds since the
+Unix epoch (UTC).
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import logging
+import os
+import sqlite3
+import sys
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'radar', 'libnexrad', 'level3'))
+
+from level3_parser import (IOBuffer, NEXRADLevel3File, _open_as_needed,  # noqa: E402
+                           header_fmt, prod_desc_fmt, prod_spec_map)
+
+log = logging.getLogger('level3_catalog')
+
+# Raw bytes read from the start of each file: the WMO header and enough of the
+# (possibly zlib compressed) message for the product description block
+HEAD_BYTES = 4096
+
+# Decompressed bytes needed for a WMO header, the message header and the
+# product description block
+PRODUCT_HEAD_BYTES = 64 + header_fmt.size + prod_desc_fmt.size
+
+COLUMNS = [
+    ('path', 'TEXT PRIMARY KEY'),
+    ('size', 'INTEGER'),
+    ('mtime', 'REAL'),
+    ('wmo_code', 'TEXT'),
+    ('awips_id', 'TEXT'),
+    ('site', 'TEXT'),
+    ('product_code', 'INTEGER'),
+    ('product_name', 'TEXT'),
+    ('elevation', 'REAL'),
+    ('el_num', 'INTEGER'),
+    ('vcp', 'INTEGER'),
+    ('vol_num', 'INTEGER'),
+    ('vol_time', 'INTEGER'),
+    ('prod_time', 'INTEGER'),
+    ('msg_offset', 'INTEGER'),
+    ('zlib', 'INTEGER'),
+    ('sym_offset', 'INTEGER'),
+    ('graph_offset', 'INTEGER'),
+    ('tab_offset', 'INTEGER'),
+]
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS products (%s)' % ', '.join('%s %s' % column
+                                                           for column in COLUMNS),
+    'CREATE INDEX IF NOT EXISTS products_awips_time ON products (awips_id, vol_time)',
+    'CREATE INDEX IF NOT EXISTS products_site_code_time '
+    'ON products (site, product_code, vol_time)',
+]
+
+
+def nexrad_to_epoch_ms(julian_date, ms_midnight):
+    """Convert a NEXRAD date and time to milliseconds since the Unix epoch."""
+    return (julian_date - 1) * 86400000 + ms_midnight
+
+
+def _elevation(code, dep_vals):
+    """Elevation angle of a product from its dependent values, None if it has none."""
+    meta = prod_spec_map.get(code, (None, None, None, ()))[3]
+    for name, block in meta:
+        if name == 'el_angle':
+            return block(list(dep_vals)) if callable(block) else dep_vals[block]
+    return None
+
+
+def _awips_id(wmo_header):
+    """AWIPS identifier (for example N0QTLX) ending a WMO header, None if absent."""
+    words = str(wmo_header, 'ascii', 'ignore').split()
+    return words[-1] if words and len(words[-1]) == 6 else None
+
+
+def read_product_header(path):
+    """
+    Return the catalog row (a dict) of a product, reading only its head.
+
+    Raises ValueError when the file does not hold a product description block,
+    for instance free text messages or general status messages.
+    """
+    stat = os.stat(path)
+    with _open_as_needed(path) as fobj:
+        raw = fobj.read(HEAD_BYTES)
+
+    # Reuse the WMO header handling of the parser on a bare instance
+    prod = NEXRADLevel3File.__new__(NEXRADLevel3File)
+    prod._buffer = IOBuffer(raw)
+    prod._process_wmo_header()
+    if prod.wmo_code == 'NOUS':
+        raise ValueError('free text message')
+    wmo_code = prod.wmo_code
+    rest = prod._buffer.get_next()
+    msg_offset = len(raw) - len(rest)
+    awips_id = _awips_id(raw[:msg_offset])
+
+    try:
+        head = zlib.decompressobj().decompress(rest, PRODUCT_HEAD_BYTES)
+        compressed = True
+    except zlib.error:
+        head = rest
+        compressed = False
+    prod._buffer = IOBuffer(head)
+    prod._process_wmo_header()
+    if prod.wmo_code:
+        wmo_code = prod.wmo_code
+        awips_id = _awips_id(head[:len(head) - len(prod._buffer.get_next())])
+
+    header = prod._buffer.read_struct(header_fmt)
+    if header.code == 2:
+        raise ValueError('general status message')
+    prod_desc = prod._buffer.read_struct(prod_desc_fmt)
+    dep_vals = [getattr(prod_desc, 'dep%d' % i) for i in range(1, 11)]
+
+    return {
+        'path': path,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'wmo_code': wmo_code,
+        'awips_id': awips_id,
+        'site': getattr(prod, 'siteID', None),
+        'product_code': header.code,
+        'product_name': prod_spec_map.get(header.code, ('Unknown Product',))[0],
+        'elevation': _elevation(header.code, dep_vals),
+        'el_num': prod_desc.el_num,
+        'vcp': prod_desc.vcp,
+        'vol_num': prod_desc.vol_num,
+        'vol_time': nexrad_to_epoch_ms(prod_desc.vol_date, prod_desc.vol_start_time * 1000),
+        'prod_time': nexrad_to_epoch_ms(prod_desc.prod_gen_date,
+                                        prod_desc.prod_gen_time * 1000),
+        'msg_offset': msg_offset,
+        'zlib': compressed,
+        'sym_offset': 2 * prod_desc.sym_off or None,
+        'graph_offset': 2 * prod_desc.graph_off or None,
+        'tab_offset': 2 * prod_desc.tab_off or None,
+    }
+
+
+def _read_or_none(path):
+    """read_product_header, returning None (and logging why) on failure."""
+    try:
+        return read_product_header(path)
+    except (ValueError, OSError, EOFError, AssertionError, zlib.error) as exc:
+        log.info('%s: not indexed, %s', path, exc)
+        return None
+
+
+def iter_paths(paths):
+    """Yield the files named in paths, walking directories recursively."""
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+def connect(database):
+    """Open (creating if needed) a catalog database."""
+    conn = sqlite3.connect(database)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def level3_catalog(paths, database, n_workers=None, batch_size=1000):
+    """
+    Index the headers of the Level III products in paths into database.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        Product files or directories holding them (walked recursively).
+    database : str
+        SQLite database file, created if needed.
+    n_workers : int, optional
+        Processes reading headers, the number of CPUs by default. 0 or 1
+        reads them in the calling process.
+    batch_size : int, optional
+        Number of rows written per transaction.
+
+    Returns
+    -------
+    indexed, skipped, failed : int
+        Number of products written, files skipped because they are already
+        in the catalog unchanged, and files that could not be indexed.
+
+    """
+    conn = connect(database)
+    known = {path: (size, mtime)
+             for path, size, mtime in conn.execute('SELECT path, size, mtime FROM products')}
+
+    def changed(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return known.get(path) != (stat.st_size, stat.st_mtime)
+
+    todo = []
+    skipped = 0
+    for path in iter_paths(paths):
+        if changed(path):
+            todo.append(path)
+        else:
+            skipped += 1
+
+    insert = 'INSERT OR REPLACE INTO products (%s) VALUES (%s)' % (
+        ', '.join(name for name, _ in COLUMNS), ', '.join(':' + name for name, _ in COLUMNS))
+    indexed = failed = 0
+    rows = []
+
+    def flush():
+        with conn:
+            conn.executemany(insert, rows)
+        rows.clear()
+
+    if n_workers in (0, 1):
+        results = map(_read_or_none, todo)
+        pool = None
+    else:
+        n_workers = n_workers or os.cpu_count() or 1
+        pool = concurrent.futures.ProcessPoolExecutor(n_workers)
+        chunksize = max(1, min(256, len(todo) // (4 * n_workers)))
+        results = pool.map(_read_or_none, todo, chunksize=chunksize)
+    try:
+        for row in results:
+            if row is None:
+                failed += 1
+                continue
+            rows.append(row)
+            indexed += 1
+            if len(rows) >= batch_size:
+                flush()
+        flush()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        conn.close()
+    return indexed, skipped, failed
+
+
+def latest_product(database, awips_id, at=None):
+    """
+    Return the catalog row (a dict) of the latest product with the AWIPS
+    identifier (for example N0QTLX) whose volume started at or before at
+    (a datetime, naive in UTC, or now if None), None if there is none.
+    """
+    if at is None:
+        at = datetime.datetime.now(datetime.timezone.utc)
+    if at.tzinfo is not None:
+        at = at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    at_ms = (at - datetime.datetime(1970, 1, 1)) // datetime.timedelta(milliseconds=1)
+    conn = connect(database)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute('SELECT * FROM products WHERE awips_id = ? AND vol_time <= ? '
+                           'ORDER BY vol_time DESC LIMIT 1', (awips_id, at_ms)).fetchone()
+    finally:
+        conn.close()
+    return None if row is None else dict(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('paths', nargs='*', help='product files or directories')
+    parser.add_argument('--db', required=True, help='SQLite catalog file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes reading headers')
+    parser.add_argument('--latest', metavar='AWIPS_ID',
+                        help='print the latest product, e.g. N0QTLX')
+    parser.add_argument('--at',
+                        help='ISO time (UTC) for --latest, the current time by default')
+    args = parser.parse_args(argv)
+
+    if args.paths:
+        indexed, skipped, failed = level3_catalog(args.paths, args.db, args.workers)
+        print('%d product(s) indexed, %d unchanged, %d not indexed'
+              % (indexed, skipped, failed))
+
+    if args.latest:
+        at = datetime.datetime.fromisoformat(args.at) if args.at else None
+        row = latest_product(args.db, args.latest, at)
+        if row is None:
+            print('no %s product in the catalog' % args.latest)
+            return 1
+        for name, _ in COLUMNS:
+            print('%-14s %s' % (name, row[name]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())